@@ -0,0 +1,149 @@
+import gzip
+from hashlib import sha256
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from rest_framework.renderers import JSONRenderer
+
+from foodgram import constants
+from recipes.models import Tag
+from users.models import Subscription
+
+RECIPE_VERSION_KEY = 'recipe-version:{}'
+RECIPE_FRAGMENT_KEY = 'recipe-fragment:{}:{}'
+REFERENCE_PAYLOAD_KEY = 'reference-payload:{}'
+INGREDIENT_INDEX_VERSION_KEY = 'ingredient-index-version'
+TAG_CATALOG_KEY = 'tag-catalog'
+FANIN_AUTHORS_KEY = 'feed-fanin-authors'
+
+
+def get_recipe_version(recipe_id):
+    """Возвращает текущую версию закешированного представления рецепта."""
+    return cache.get_or_set(
+        RECIPE_VERSION_KEY.format(recipe_id),
+        lambda: uuid4().hex,
+        constants.RECIPE_CACHE_TIMEOUT,
+    )
+
+
+def get_recipe_fragment(recipe_id):
+    """Возвращает закешированное представление рецепта или None."""
+    return cache.get(
+        RECIPE_FRAGMENT_KEY.format(recipe_id, get_recipe_version(recipe_id))
+    )
+
+
+def set_recipe_fragment(recipe_id, fragment):
+    """Сохраняет представление рецепта под его текущей версией."""
+    cache.set(
+        RECIPE_FRAGMENT_KEY.format(recipe_id, get_recipe_version(recipe_id)),
+        fragment,
+        constants.RECIPE_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_recipes(recipe_ids):
+    """
+    Сбрасывает версии рецептов: старые представления перестают
+    использоваться и вытесняются из кеша по таймауту.
+
+    Версии сбрасываются после фиксации транзакции: иначе параллельный
+    запрос успел бы прочитать старую строку и сохранить её представление
+    под уже новой версией.
+    """
+    keys = [RECIPE_VERSION_KEY.format(recipe_id) for recipe_id in recipe_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_table_stamp(queryset):
+    """
+    Возвращает отпечаток данных таблицы: число строк и наибольший id.
+    Он меняется при любой вставке или удалении, в том числе сделанных
+    bulk-операциями или другим процессом.
+    """
+    stamp = queryset.order_by().aggregate(count=Count('pk'), last=Max('pk'))
+    return stamp['count'], stamp['last']
+
+
+def get_reference_payload(name, stamp, get_data):
+    """
+    Возвращает заранее собранный ответ справочника: тело в JSON,
+    его сжатую копию и ETag для каждой из них.
+
+    Ответ пересобирается, если изменился отпечаток данных stamp,
+    и в любом случае живёт не дольше REFERENCE_PAYLOAD_TIMEOUT, чтобы
+    правки существующих строк доходили до процессов, не получивших
+    сигнал.
+    """
+    key = REFERENCE_PAYLOAD_KEY.format(name)
+    payload = cache.get(key)
+    if payload is None or payload['stamp'] != stamp:
+        body = JSONRenderer().render(get_data())
+        digest = sha256(body).hexdigest()
+        payload = {
+            'stamp': stamp,
+            'body': body,
+            'gzip': gzip.compress(body),
+            'etag': f'"{digest}"',
+            'gzip_etag': f'"{digest}-gzip"',
+        }
+        cache.set(key, payload, constants.REFERENCE_PAYLOAD_TIMEOUT)
+    return payload
+
+
+def invalidate_reference_payload(name):
+    """Удаляет собранный ответ справочника."""
+    cache.delete(REFERENCE_PAYLOAD_KEY.format(name))
+
+
+def get_ingredient_index_version():
+    """Возвращает версию данных для индекса ингредиентов."""
+    return cache.get_or_set(
+        INGREDIENT_INDEX_VERSION_KEY, lambda: uuid4().hex, None
+    )
+
+
+def invalidate_ingredient_index():
+    """Помечает индексы ингредиентов во всех процессах устаревшими."""
+    cache.delete(INGREDIENT_INDEX_VERSION_KEY)
+
+
+def get_tag_catalog(refresh=False):
+    """
+    Возвращает словарь {slug: id} всех тегов. С refresh=True каталог
+    перечитывается из базы, минуя кеш.
+    """
+    if not refresh:
+        catalog = cache.get(TAG_CATALOG_KEY)
+        if catalog is not None:
+            return catalog
+    catalog = dict(Tag.objects.values_list('slug', 'id'))
+    cache.set(TAG_CATALOG_KEY, catalog, constants.TAG_CATALOG_TIMEOUT)
+    return catalog
+
+
+def invalidate_tag_catalog():
+    """Удаляет закешированный каталог тегов."""
+    cache.delete(TAG_CATALOG_KEY)
+
+
+def get_fanin_author_ids():
+    """
+    Возвращает id авторов, у которых подписчиков больше
+    FEED_FANOUT_LIMIT. Их рецепты не раскладываются по лентам,
+    а подмешиваются при чтении (fan-in).
+    """
+    return cache.get_or_set(
+        FANIN_AUTHORS_KEY,
+        lambda: frozenset(
+            Subscription.objects.values('following').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=constants.FEED_FANOUT_LIMIT
+            ).values_list('following', flat=True)
+        ),
+        constants.FEED_FANIN_CACHE_TIMEOUT,
+    )
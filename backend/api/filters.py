@@ -1,7 +1,36 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django_filters.fields import MultipleChoiceField
 from django_filters.rest_framework import filters as djangofilters, FilterSet
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe
+from foodgram import constants
+from recipes.models import FavoriteRecipe, Ingredient, Recipe, ShoppingCart
+
+from .cache import get_tag_catalog
+from .search import ingredient_index
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_catalog()]
+
+
+class TagChoiceField(MultipleChoiceField):
+    """
+    Поле слагов тегов. Неизвестный слаг перед отказом сверяется
+    с каталогом, перечитанным из базы: тег мог появиться в другом
+    процессе, а закешированный каталог ещё не истёк.
+    """
+
+    def valid_value(self, value):
+        return (
+            value in get_tag_catalog()
+            or value in get_tag_catalog(refresh=True)
+        )
+
+
+class TagChoiceFilter(djangofilters.MultipleChoiceFilter):
+    field_class = TagChoiceField
 
 
 class IngredientSearchFilter(SearchFilter):
@@ -11,16 +40,34 @@ class IngredientSearchFilter(SearchFilter):
         model = Ingredient
         fields = ('name', )
 
+    def filter_queryset(self, request, queryset, view):
+        if not settings.INGREDIENT_INDEX_ENABLED:
+            return super().filter_queryset(request, queryset, view)
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return ingredient_index.search(
+            query, constants.INGREDIENT_SEARCH_LIMIT
+        )
+
 
 class RecipeFilterBackend(FilterSet):
+    """
+    Фильтры списка рецептов. Теги, избранное и корзина проверяются
+    подзапросами EXISTS, поэтому выборка не размножает строки рецептов
+    и не требует DISTINCT.
+    """
+
+    search = djangofilters.CharFilter(method='search_recipes')
     is_favorited = djangofilters.NumberFilter(
         method='get_favorite_recipes'
     )
     is_in_shopping_cart = djangofilters.NumberFilter(
         method='get_is_in_shopping_cart'
     )
-    tags = djangofilters.AllValuesMultipleFilter(
-        field_name='tags__slug'
+    tags = TagChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
     )
 
     class Meta:
@@ -29,19 +76,42 @@ class RecipeFilterBackend(FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
-            'tags'
+            'tags',
+            'search',
         )
 
+    def search_recipes(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return queryset.search(value)
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        catalog = get_tag_catalog()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag_id__in=[
+                    catalog[slug] for slug in value if slug in catalog
+                ],
+            )
+        ))
+
     def get_is_in_shopping_cart(self, queryset, name, value) -> any:
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                shopping_carts__user=self.request.user
-            )
+            return queryset.filter(Exists(
+                ShoppingCart.objects.filter(
+                    user=self.request.user, recipe=OuterRef('pk')
+                )
+            ))
         return queryset
 
     def get_favorite_recipes(self, queryset, name, value) -> any:
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                favorite_recipes__user=self.request.user
-            )
+            return queryset.filter(Exists(
+                FavoriteRecipe.objects.filter(
+                    user=self.request.user, recipe=OuterRef('pk')
+                )
+            ))
         return queryset
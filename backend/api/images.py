@@ -0,0 +1,158 @@
+import logging
+from base64 import b64decode
+from binascii import Error as BinasciiError
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from foodgram import constants
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_ERRORS = (
+    BinasciiError,
+    OSError,
+    SyntaxError,
+    ValueError,
+    Image.DecompressionBombError,
+)
+
+REDUCED_IMAGE_VARIANTS = (
+    ('image_medium', constants.RECIPE_IMAGE_MEDIUM_SIZE),
+    ('image_thumb', constants.RECIPE_IMAGE_THUMB_SIZE),
+)
+IMAGE_VARIANTS = (
+    ('image', constants.RECIPE_IMAGE_MAX_SIZE),
+    *REDUCED_IMAGE_VARIANTS,
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+    thread_name_prefix='recipe-images',
+)
+
+
+def decode_image_data(data):
+    """Возвращает байты изображения из data URI в base64."""
+    return b64decode(data.split(';base64,', 1)[1], validate=True)
+
+
+def verify_image(data):
+    """
+    Проверяет, что data URI содержит изображение, которое можно открыть.
+    Пиксели не декодируются, поэтому проверка дешёвая и подходит для
+    запроса; при ошибке выбрасывается одно из IMAGE_ERRORS.
+    """
+    with Image.open(BytesIO(decode_image_data(data))) as image:
+        image.verify()
+
+
+def open_image(raw):
+    """Открывает изображение с учётом ориентации из EXIF."""
+    with Image.open(BytesIO(raw)) as image:
+        return ImageOps.exif_transpose(image).convert('RGB')
+
+
+def encode_image(image, size):
+    """
+    Пережимает изображение в JPEG не больше size по каждой стороне.
+    Метаданные (EXIF и т.п.) в результат не переносятся.
+    """
+    image = image.copy()
+    image.thumbnail((size, size))
+    buffer = BytesIO()
+    image.save(
+        buffer, 'JPEG', quality=constants.RECIPE_IMAGE_QUALITY, optimize=True
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def save_image_variants(recipe, image, variants=None):
+    """
+    Сохраняет в рецепт изображения указанных размеров: по умолчанию
+    основное изображение и его уменьшенные копии.
+    """
+    name = f'{uuid4().hex}.jpg'
+    for field, size in variants or IMAGE_VARIANTS:
+        getattr(recipe, field).save(
+            name, encode_image(image, size), save=False
+        )
+
+
+def store_image_upload(recipe, data):
+    """
+    Сохраняет загруженное изображение в хранилище до обработки и помечает
+    рецепт как обрабатываемый. Рецепт сохраняет вызывающий код.
+
+    Файл переживает перезапуск процесса, поэтому незавершённую обработку
+    можно повторить командой process_pending_images.
+    """
+    extension = data.split(';', 1)[0].split('/', 1)[1]
+    recipe.image_upload.save(
+        f'{uuid4().hex}.{extension}',
+        ContentFile(decode_image_data(data)),
+        save=False
+    )
+    recipe.image_processing = True
+
+
+def process_recipe_image(recipe_id):
+    """
+    Создаёт все размеры изображения рецепта из загруженного файла
+    и удаляет его. Если изображение обработать не удалось, рецепт
+    помечается флагом image_failed, а прежнее изображение (при правке)
+    остаётся.
+    """
+    try:
+        recipe = Recipe.objects.get(pk=recipe_id)
+        upload = recipe.image_upload.name
+        if not upload:
+            return
+        try:
+            with recipe.image_upload.open('rb') as file:
+                image = open_image(file.read())
+        except IMAGE_ERRORS:
+            logger.exception('Не удалось обработать изображение рецепта %s',
+                             recipe_id)
+            recipe.image_failed = True
+        else:
+            save_image_variants(recipe, image)
+            recipe.image_failed = False
+        recipe.image_upload = ''
+        recipe.image_processing = False
+        recipe.save(update_fields=(
+            'image', 'image_medium', 'image_thumb', 'image_upload',
+            'image_processing', 'image_failed'
+        ))
+        recipe.image_upload.storage.delete(upload)
+    except Recipe.DoesNotExist:
+        pass
+
+
+def process_recipe_image_in_background(recipe_id):
+    """Обработка в потоке пула: соединение с базой потока закрывается."""
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue_recipe_image(recipe_id):
+    """
+    Ставит обработку изображения в очередь после фиксации транзакции.
+    При IMAGE_PROCESSING_ASYNC=False изображение обрабатывается сразу.
+    """
+    if settings.IMAGE_PROCESSING_ASYNC:
+        transaction.on_commit(
+            lambda: executor.submit(
+                process_recipe_image_in_background, recipe_id
+            )
+        )
+    else:
+        transaction.on_commit(lambda: process_recipe_image(recipe_id))
@@ -0,0 +1,192 @@
+import json
+from itertools import islice
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from rest_framework import serializers
+
+from foodgram import constants
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+from .services import fan_out_recipes
+
+
+class ImportIngredientSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.IntegerField(
+        min_value=constants.AMOUNT_MIN_VALUE,
+        max_value=constants.AMOUNT_MAХ_VALUE
+    )
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    """Строка NDJSON-импорта: рецепт со ссылками на теги и ингредиенты."""
+
+    author = serializers.EmailField(required=False)
+    name = serializers.CharField(max_length=constants.RECIPE_NAME_LENGTH)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(
+        min_value=constants.COOKING_TIME_MIN_VALUE,
+        max_value=constants.COOKING_TIME_MAX_VALUE
+    )
+    image = serializers.CharField(
+        max_length=Recipe._meta.get_field('image').max_length
+    )
+    tags = serializers.ListField(child=serializers.SlugField())
+    ingredients = ImportIngredientSerializer(many=True)
+
+    def validate_image(self, value):
+        """
+        Изображение импортируется ссылкой на уже загруженный файл:
+        путь относительно хранилища поля image.
+        """
+        if value.startswith('data:'):
+            raise serializers.ValidationError(
+                'Ожидается путь к файлу в хранилище, а не данные изображения'
+            )
+        storage = Recipe._meta.get_field('image').storage
+        try:
+            exists = storage.exists(value)
+        except SuspiciousFileOperation:
+            exists = False
+        if not exists:
+            raise serializers.ValidationError(f'Файл не найден: {value}')
+        return value
+
+    def validate_tags(self, value):
+        tags = self.context['tags']
+        missing = [slug for slug in value if slug not in tags]
+        if missing:
+            raise serializers.ValidationError(
+                f'Несуществующие теги: {missing}'
+            )
+        return list(dict.fromkeys(tags[slug] for slug in value))
+
+    def validate_ingredients(self, value):
+        ingredients = self.context['ingredients']
+        resolved = {}
+        missing = []
+        for item in value:
+            key = (
+                item['name'].strip().casefold(),
+                item['measurement_unit'].strip().casefold()
+            )
+            if key not in ingredients:
+                missing.append(item['name'])
+            elif ingredients[key] in resolved:
+                raise serializers.ValidationError(
+                    'Дублирование ингредиентов'
+                )
+            else:
+                resolved[ingredients[key]] = item['amount']
+        if missing:
+            raise serializers.ValidationError(
+                f'Несуществующие ингредиенты: {missing}'
+            )
+        if not resolved:
+            raise serializers.ValidationError('Поле отсутствует')
+        return resolved
+
+
+class RecipeImporter:
+    """
+    Импорт рецептов из NDJSON (один рецепт в строке).
+
+    Строки обрабатываются пачками: каждая пачка валидируется целиком,
+    затем рецепты, их ингредиенты и теги вставляются через bulk_create
+    в одной транзакции и раскладываются по лентам подписчиков. Теги
+    и ингредиенты ищутся по slug и по паре (название, единица измерения)
+    в словарях, загруженных один раз.
+    Ошибки возвращаются с номером строки.
+    """
+
+    def __init__(self, default_author=None,
+                 chunk_size=constants.RECIPE_IMPORT_CHUNK_SIZE):
+        self.default_author = default_author
+        self.chunk_size = chunk_size
+        self.context = {
+            'tags': dict(Tag.objects.values_list('slug', 'id')),
+            'ingredients': {
+                (name.casefold(), measurement_unit.casefold()): pk
+                for pk, name, measurement_unit in
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            },
+        }
+        self.created = 0
+        self.errors = []
+
+    def run(self, lines):
+        lines = enumerate(lines, start=1)
+        while chunk := list(islice(lines, self.chunk_size)):
+            self.import_chunk(chunk)
+        return {'created': self.created, 'errors': self.errors}
+
+    def import_chunk(self, chunk):
+        valid = []
+        for number, line in chunk:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as error:
+                self.errors.append({'line': number, 'errors': str(error)})
+                continue
+            serializer = RecipeImportSerializer(
+                data=data, context=self.context
+            )
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.errors.append(
+                    {'line': number, 'errors': serializer.errors}
+                )
+
+        authors = User.objects.in_bulk(
+            {data['author'] for _, data in valid if 'author' in data},
+            field_name='email'
+        )
+        recipes = []
+        for number, data in valid:
+            author = (
+                authors.get(data['author']) if 'author' in data
+                else self.default_author
+            )
+            if author is None:
+                self.errors.append({
+                    'line': number,
+                    'errors': {'author': 'Автор не найден'}
+                })
+                continue
+            recipes.append((Recipe(
+                author=author,
+                name=data['name'],
+                text=data['text'],
+                cooking_time=data['cooking_time'],
+                image=data['image'],
+            ), data))
+        if recipes:
+            self.save_recipes(recipes)
+
+    def save_recipes(self, recipes):
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipe for recipe, _ in recipes)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                for recipe, data in recipes
+                for ingredient_id, amount in data['ingredients'].items()
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe, data in recipes
+                for tag_id in data['tags']
+            )
+            fan_out_recipes([recipe for recipe, _ in recipes])
+        self.created += len(recipes)
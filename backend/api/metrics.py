@@ -0,0 +1,266 @@
+import atexit
+import fcntl
+import json
+import os
+from bisect import bisect_left
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from django.conf import settings
+
+from foodgram import constants
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+QUANTILES = (0.5, 0.95, 0.99)
+ARCHIVE_NAME = 'archive.json'
+LOCK_NAME = '.lock'
+
+
+def empty_series():
+    return {
+        'requests': 0,
+        'errors': 0,
+        'latency_sum': 0.0,
+        'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'queries_sum': 0,
+        'queries_buckets': [0] * (len(QUERY_BUCKETS) + 1),
+    }
+
+
+def merge_series(target, source):
+    for key in ('requests', 'errors', 'latency_sum', 'queries_sum'):
+        target[key] += source[key]
+    for key in ('latency_buckets', 'queries_buckets'):
+        target[key] = [a + b for a, b in zip(target[key], source[key])]
+
+
+def merge_data(merged, data):
+    """Добавляет в словарь merged серии из файла метрик."""
+    for route, method, series in data:
+        merge_series(
+            merged.setdefault((route, method), empty_series()), series
+        )
+    return merged
+
+
+def read_data(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return []
+
+
+def write_data(path, data):
+    """Атомарно записывает файл метрик."""
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(data)
+    os.replace(temporary, path)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def quantile(q, bounds, buckets):
+    """
+    Оценивает квантиль по гистограмме линейной интерполяцией внутри
+    корзины, как histogram_quantile в Prometheus.
+    """
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(buckets):
+        if cumulative + count >= rank and count:
+            if index == len(bounds):
+                return bounds[-1]
+            lower = bounds[index - 1] if index else 0.0
+            share = (rank - cumulative) / count
+            return lower + (bounds[index] - lower) * share
+        cumulative += count
+    return bounds[-1]
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик API по маршрутам DRF.
+
+    Каждый процесс копит счётчики и гистограммы в памяти и атомарно
+    сохраняет их в свой файл в METRICS_DIR не чаще раза
+    в METRICS_FLUSH_INTERVAL секунд и при завершении. При выдаче метрик
+    файлы всех процессов (воркеров gunicorn) суммируются, а файлы
+    завершившихся процессов переносятся в общий архив и удаляются,
+    так что счётчики не убывают, а число файлов не растёт.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._lock = Lock()
+        self._flushed_at = monotonic()
+        self._token = uuid4().hex
+        atexit.register(self.close)
+
+    @property
+    def directory(self):
+        return Path(settings.METRICS_DIR)
+
+    def record(self, route, method, status, duration, queries):
+        with self._lock:
+            series = self._series.setdefault(
+                (route, method), empty_series()
+            )
+            series['requests'] += 1
+            series['errors'] += status >= 500
+            series['latency_sum'] += duration
+            series['latency_buckets'][
+                bisect_left(LATENCY_BUCKETS, duration)
+            ] += 1
+            series['queries_sum'] += queries
+            series['queries_buckets'][
+                bisect_left(QUERY_BUCKETS, queries)
+            ] += 1
+            due = (
+                monotonic() - self._flushed_at
+                >= constants.METRICS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            data = json.dumps([
+                [route, method, series]
+                for (route, method), series in self._series.items()
+            ])
+            self._flushed_at = monotonic()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        write_data(
+            self.directory / f'{os.getpid()}-{self._token}.json', data
+        )
+
+    def close(self):
+        """Сохраняет накопленное при завершении процесса."""
+        if self._series:
+            self.flush()
+
+    def prune(self):
+        """
+        Переносит в архив файлы завершившихся процессов.
+        Вызывается под файловой блокировкой каталога.
+        """
+        dead = [
+            path for path in self.directory.glob('*-*.json')
+            if not is_alive(int(path.name.split('-', 1)[0]))
+        ]
+        if not dead:
+            return
+        archive = self.directory / ARCHIVE_NAME
+        merged = merge_data({}, read_data(archive))
+        for path in dead:
+            merge_data(merged, read_data(path))
+        write_data(archive, json.dumps([
+            [route, method, series]
+            for (route, method), series in merged.items()
+        ]))
+        for path in dead:
+            path.unlink(missing_ok=True)
+
+    def collect(self):
+        """Возвращает метрики всех процессов, сложенные по маршрутам."""
+        self.flush()
+        merged = {}
+        with open(self.directory / LOCK_NAME, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.prune()
+            for path in self.directory.glob('*.json'):
+                merge_data(merged, read_data(path))
+        return merged
+
+    def render_prometheus(self):
+        """Отдаёт метрики в текстовом формате Prometheus."""
+        lines = []
+        series = sorted(self.collect().items())
+
+        def header(name, metric_type, description):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+        def labels(route, method, **extra):
+            pairs = {'route': route, 'method': method, **extra}
+            return ','.join(f'{key}="{value}"' for key, value in pairs.items())
+
+        header('foodgram_http_requests_total', 'counter',
+               'Количество запросов к API.')
+        for (route, method), data in series:
+            lines.append(
+                f'foodgram_http_requests_total{{{labels(route, method)}}} '
+                f'{data["requests"]}'
+            )
+        header('foodgram_http_errors_total', 'counter',
+               'Количество ответов API со статусом 5xx.')
+        for (route, method), data in series:
+            lines.append(
+                f'foodgram_http_errors_total{{{labels(route, method)}}} '
+                f'{data["errors"]}'
+            )
+        self.render_histogram(
+            lines, header, labels, series,
+            'foodgram_http_request_duration_seconds',
+            'Время обработки запроса, секунды.',
+            'latency', LATENCY_BUCKETS
+        )
+        header('foodgram_http_request_duration_quantile_seconds', 'gauge',
+               'Квантили времени обработки, оценка по гистограмме.')
+        for (route, method), data in series:
+            for q in QUANTILES:
+                value = quantile(
+                    q, LATENCY_BUCKETS, data['latency_buckets']
+                )
+                lines.append(
+                    'foodgram_http_request_duration_quantile_seconds'
+                    f'{{{labels(route, method, quantile=q)}}} {value:.6f}'
+                )
+        self.render_histogram(
+            lines, header, labels, series,
+            'foodgram_db_queries', 'Количество SQL-запросов на запрос.',
+            'queries', QUERY_BUCKETS
+        )
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def render_histogram(lines, header, labels, series, name, description,
+                         prefix, bounds):
+        header(name, 'histogram', description)
+        for (route, method), data in series:
+            cumulative = 0
+            for bound, count in zip(
+                (*bounds, '+Inf'), data[f'{prefix}_buckets']
+            ):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{labels(route, method, le=bound)}}} '
+                    f'{cumulative}'
+                )
+            lines.append(
+                f'{name}_sum{{{labels(route, method)}}} '
+                f'{data[f"{prefix}_sum"]}'
+            )
+            lines.append(
+                f'{name}_count{{{labels(route, method)}}} '
+                f'{data["requests"]}'
+            )
+
+
+registry = MetricsRegistry()
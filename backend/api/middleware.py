@@ -0,0 +1,121 @@
+import json
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import registry
+
+logger = logging.getLogger('api.timing')
+
+
+class QueryTimer:
+    """Считает количество и суммарное время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - start
+            self.count += 1
+
+
+def time_serialization(request, serializer):
+    """
+    Учитывает время to_representation сериализатора в метриках запроса.
+    SQL-запросы, выполненные при сериализации, остаются в db.
+    """
+    request = getattr(request, '_request', request)
+    to_representation = serializer.to_representation
+
+    def timed(instance):
+        timer = getattr(request, '_query_timer', None)
+        db_before = timer.duration if timer else 0.0
+        start = perf_counter()
+        try:
+            return to_representation(instance)
+        finally:
+            db = timer.duration - db_before if timer else 0.0
+            request._serialize_duration = (
+                getattr(request, '_serialize_duration', 0.0)
+                + perf_counter() - start - db
+            )
+
+    serializer.to_representation = timed
+    return serializer
+
+
+class ServerTimingMiddleware:
+    """
+    Замеряет запросы к приложению api: число и время SQL-запросов,
+    время сериализаторов (time_serialization), рендеринга ответа,
+    остальное время приложения и общее время.
+
+    Результат отдаётся в заголовке Server-Timing и пишется в лог
+    одной JSON-строкой, а также попадает в агрегированные метрики.
+    Запросы, превысившие API_QUERY_BUDGET, логируются как предупреждения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        request._query_timer = timer
+        request._serialize_duration = 0.0
+        request._render_duration = 0.0
+        start = perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        total = perf_counter() - start
+
+        match = request.resolver_match
+        if match is None or match.app_name != 'api':
+            return response
+
+        metrics = {
+            'route': match.url_name,
+            'method': request.method,
+            'status': response.status_code,
+            'db_queries': timer.count,
+            'db_ms': round(timer.duration * 1000, 2),
+            'serialize_ms': round(request._serialize_duration * 1000, 2),
+            'render_ms': round(request._render_duration * 1000, 2),
+            'app_ms': round((
+                total - timer.duration - request._serialize_duration
+                - request._render_duration
+            ) * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'over_budget': timer.count > settings.API_QUERY_BUDGET,
+        }
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={metrics["db_ms"]};desc="{timer.count} queries"',
+            f'serialize;dur={metrics["serialize_ms"]}',
+            f'render;dur={metrics["render_ms"]}',
+            f'app;dur={metrics["app_ms"]}',
+            f'total;dur={metrics["total_ms"]}',
+        ))
+        registry.record(
+            match.url_name, request.method, response.status_code,
+            total, timer.count
+        )
+        if metrics['over_budget']:
+            logger.warning(json.dumps(metrics))
+        else:
+            logger.info(json.dumps(metrics))
+        return response
+
+    def process_template_response(self, request, response):
+        start = perf_counter()
+
+        def finish_render(rendered):
+            request._render_duration += perf_counter() - start
+
+        response.add_post_render_callback(finish_render)
+        return response
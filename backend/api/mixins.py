@@ -0,0 +1,57 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from foodgram import constants
+
+from .cache import get_reference_payload, get_table_stamp
+from .middleware import time_serialization
+
+
+class CachedListMixin:
+    """
+    Отдаёт неотфильтрованный список из заранее собранного ответа
+    с ETag и поддержкой условных запросов. Сжатое и несжатое тело
+    имеют разные ETag.
+    """
+
+    cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_queryset()
+        payload = get_reference_payload(
+            self.cache_name,
+            get_table_stamp(queryset),
+            lambda: self.get_serializer(queryset, many=True).data
+        )
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            body, etag, encoding = (
+                payload['gzip'], payload['gzip_etag'], 'gzip'
+            )
+        else:
+            body, etag, encoding = payload['body'], payload['etag'], None
+        etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={constants.REFERENCE_CACHE_MAX_AGE}'
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class SerializeTimingMixin:
+    """Учитывает время сериализаторов вьюсета в Server-Timing."""
+
+    def get_serializer(self, *args, **kwargs):
+        return time_serialization(
+            self.request, super().get_serializer(*args, **kwargs)
+        )
@@ -1,9 +1,260 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from datetime import datetime
+from hashlib import sha256
 
-from foodgram.constants import PAGE_SIZE_PAGINATORS
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.constants import (
+    COUNT_CACHE_TIMEOUT,
+    KEYSET_MAX_PAGE_SIZE,
+    PAGE_SIZE_PAGINATORS,
+)
 
 
 class PageLimitPagination(PageNumberPagination):
     """A pagination class that limits the number of items per page."""
     page_size = PAGE_SIZE_PAGINATORS
     page_size_query_param = 'limit'
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, который кеширует количество объектов для набора фильтров.
+
+    Ключом служит SQL выборки без аннотаций, то есть только её условия.
+    На PostgreSQL для больших выборок вместо COUNT(*) берётся оценка
+    планировщика из EXPLAIN, и count_exact становится False.
+    """
+
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query, params = queryset.values('pk').query.sql_with_params()
+        key = 'paginator-count:' + sha256(
+            repr((query, params)).encode()
+        ).hexdigest()
+        cached = cache.get(key)
+        if cached is None:
+            cached = self._estimate_count(queryset)
+            if cached is None:
+                cached = (queryset.count(), True)
+            cache.set(key, cached, COUNT_CACHE_TIMEOUT)
+        count, self.count_exact = cached
+        return count
+
+    def page(self, number):
+        """
+        В отличие от базового класса не обрезает страницу по count:
+        закешированное или оценочное значение может отставать от данных.
+        """
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    @staticmethod
+    def _estimate_count(queryset):
+        if connections[queryset.db].vendor != 'postgresql':
+            return None
+        plan = json.loads(queryset.explain(format='json'))
+        estimate = plan[0]['Plan']['Plan Rows']
+        if estimate < settings.COUNT_ESTIMATE_THRESHOLD:
+            return None
+        return estimate, False
+
+
+class CachedCountPagination(PageLimitPagination):
+    """
+    Постраничная пагинация с кешированным или оценочным количеством.
+    Поле count_exact в ответе показывает, точное ли значение count.
+    """
+
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_exact'] = {'type': 'boolean'}
+        return response_schema
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу (pub_date, id) в порядке убывания.
+
+    Страницы выбираются условием по ключу последнего показанного объекта,
+    поэтому не нужны ни COUNT(*), ни OFFSET. Курсор непрозрачен для
+    клиента: это base64 от направления и ключа граничного объекта.
+    """
+
+    page_size = PAGE_SIZE_PAGINATORS
+    page_size_query_param = 'limit'
+    max_page_size = KEYSET_MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering = ('pub_date', 'id')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.start(request)
+        return self.finish(self.seek(queryset))
+
+    def start(self, request):
+        """Читает из запроса размер страницы и курсор."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+    def seek(self, queryset, ordering=None):
+        """
+        Возвращает до page_size + 1 объектов после позиции курсора
+        в порядке обхода. ordering задаёт поля ключа выборки, если они
+        называются иначе, чем в self.ordering.
+        """
+        first, second = ordering or self.ordering
+        lookup = 'gt' if self.reverse else 'lt'
+        if self.position is not None:
+            first_value, second_value = self.position
+            queryset = queryset.filter(
+                Q(**{f'{first}__{lookup}': first_value})
+                | Q(**{first: first_value})
+                & Q(**{f'{second}__{lookup}': second_value})
+            )
+        if self.reverse:
+            queryset = queryset.order_by(first, second)
+        else:
+            queryset = queryset.order_by(f'-{first}', f'-{second}')
+        return list(queryset[:self.page_size + 1])
+
+    def finish(self, page):
+        """Обрезает выборку до страницы и определяет соседние страницы."""
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.reverse:
+            page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        self.page = page
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_position(self, obj):
+        return tuple(getattr(obj, field) for field in self.ordering)
+
+    def encode_cursor(self, obj, reverse):
+        first_value, second_value = self.get_position(obj)
+        token = urlsafe_b64encode(json.dumps(
+            (reverse, first_value.isoformat(), second_value)
+        ).encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            token
+        )
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            reverse, first_value, second_value = json.loads(
+                urlsafe_b64decode(token.encode())
+            )
+            return (
+                (datetime.fromisoformat(first_value), int(second_value)),
+                bool(reverse)
+            )
+        except (BinasciiError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Пагинация ленты подписок по ключу (pub_date, id).
+
+    Страница собирается из записей ленты пользователя (fan-out) и рецептов
+    авторов с fan-in: из каждого источника берётся не больше page_size + 1
+    ключей после курсора, ключи сливаются, и рецепты страницы загружаются
+    одним запросом по id.
+    """
+
+    def paginate_feed(self, queryset, entries, fanin_recipes, request):
+        self.start(request)
+        keys = {
+            (entry.pub_date, entry.recipe_id)
+            for entry in self.seek(
+                entries.only('pub_date', 'recipe_id'),
+                ('pub_date', 'recipe_id')
+            )
+        }
+        if fanin_recipes is not None:
+            keys.update(
+                (recipe.pub_date, recipe.id)
+                for recipe in self.seek(fanin_recipes.only('pub_date'))
+            )
+        keys = sorted(keys, reverse=not self.reverse)[:self.page_size + 1]
+        recipes = queryset.in_bulk([recipe_id for _, recipe_id in keys])
+        return self.finish([
+            recipes[recipe_id] for _, recipe_id in keys
+            if recipe_id in recipes
+        ])
@@ -0,0 +1,94 @@
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+
+from foodgram import constants
+from recipes.models import Ingredient
+
+from .cache import get_ingredient_index_version, get_table_stamp
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся в отсортированном списке в casefold-виде, поэтому
+    поиск по префиксу сводится к бинарному поиску. Индекс перестраивается,
+    когда меняется версия ингредиентов в кеше (сигналы этого процесса
+    или общий кеш) либо отпечаток таблицы в БД (загрузка из другого
+    процесса), и не реже раза в INGREDIENT_INDEX_TIMEOUT секунд.
+
+    Версия и отпечаток сверяются не чаще раза
+    в INGREDIENT_INDEX_CHECK_INTERVAL секунд, поэтому большинство
+    запросов автодополнения не обращаются ни к кешу, ни к БД.
+    Изменения из других процессов видны с этой задержкой.
+    """
+
+    def __init__(self):
+        self._data = ((), ())
+        self._version = None
+        self._built_at = None
+        self._checked_at = None
+        self._lock = Lock()
+
+    def expire(self):
+        """Заставляет сверить версию индекса при следующем поиске."""
+        self._checked_at = None
+
+    def search(self, query, limit):
+        """
+        Возвращает до limit ингредиентов: сначала совпадения по началу
+        названия, затем по вхождению подстроки.
+        """
+        keys, items = self._get_data()
+        query = query.strip().casefold()
+        position = bisect_left(keys, query)
+        end = position
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        results = items[position:min(end, position + limit)]
+        if len(results) < limit:
+            results.extend(
+                item for key, item in zip(keys, items)
+                if query in key and not key.startswith(query)
+            )
+        return results[:limit]
+
+    def _get_data(self):
+        checked_at = self._checked_at
+        if checked_at is not None and (
+            monotonic() - checked_at
+            < constants.INGREDIENT_INDEX_CHECK_INTERVAL
+        ):
+            return self._data
+        version = (
+            get_ingredient_index_version(),
+            get_table_stamp(Ingredient.objects.all()),
+        )
+        if self._is_stale(version):
+            with self._lock:
+                if self._is_stale(version):
+                    self._build(version)
+        self._checked_at = monotonic()
+        return self._data
+
+    def _is_stale(self, version):
+        return (
+            self._version != version
+            or monotonic() - self._built_at
+            > constants.INGREDIENT_INDEX_TIMEOUT
+        )
+
+    def _build(self, version):
+        items = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (ingredient.name.casefold(), ingredient.id)
+        )
+        self._data = (
+            [ingredient.name.casefold() for ingredient in items], items
+        )
+        self._built_at = monotonic()
+        self._version = version
+
+
+ingredient_index = IngredientIndex()
@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 
@@ -9,9 +11,23 @@ from recipes.models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
 
+from .cache import get_recipe_fragment, set_recipe_fragment
+from .images import (
+    IMAGE_ERRORS,
+    enqueue_recipe_image,
+    store_image_upload,
+    verify_image,
+)
+from .services import (
+    get_following_ids,
+    get_recipes_limit,
+    refresh_shopping_lists,
+)
+
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -29,10 +45,7 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(user=user, following=obj).exists()
+        return obj.id in get_following_ids(self.context.get('request'))
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -76,7 +89,7 @@ class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=constants.INGREDIENT_MIN, max_value=constants.INGREDIENT_MAX,
         error_messages={
@@ -120,11 +133,61 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_medium',
+            'image_thumb',
+            'image_processing',
+            'image_failed',
             'text',
             'cooking_time'
         )
 
+    image_fields = ('image', 'image_medium', 'image_thumb')
+
+    def to_representation(self, instance):
+        """
+        Собирает представление рецепта из закешированной части,
+        не зависящей от пользователя и запроса, флагов текущего
+        пользователя и ссылок на изображения, которые строятся от хоста
+        текущего запроса.
+        Ответы на запись (skip_fragment_cache) кеш не используют:
+        объект в памяти может отставать от фоновой обработки.
+        """
+        if self.context.get('skip_fragment_cache'):
+            return super().to_representation(instance)
+        fragment = get_recipe_fragment(instance.id)
+        if fragment is None:
+            data = super().to_representation(instance)
+            fragment = {
+                **data,
+                'author': {**data['author'], 'is_subscribed': None},
+                'is_favorited': None,
+                'is_in_shopping_cart': None,
+            }
+            for name in self.image_fields:
+                del fragment[name]
+            set_recipe_fragment(instance.id, fragment)
+            return data
+        return {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': self.fields['author'].get_is_subscribed(
+                    instance.author
+                ),
+            },
+            'is_favorited': self.get_is_favorited(instance),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(instance),
+            **{
+                name: self.fields[name].to_representation(
+                    getattr(instance, name)
+                )
+                for name in self.image_fields
+            },
+        }
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return bool(
             request
@@ -133,6 +196,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return bool(
             request
@@ -141,18 +206,40 @@ class RecipeListSerializer(serializers.ModelSerializer):
         )
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.ReadOnlyField(source='total_amount')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount',
+            'recipe_count'
+        )
+
+
 class RecipeAddSerializer(serializers.ModelSerializer):
     author = UserSerializer(
         read_only=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
     )
     ingredients = AddIngredientSerializer(
         many=True,
     )
-    image = Base64ImageField(allow_null=False, allow_empty_file=False)
+    image = serializers.RegexField(
+        constants.RECIPE_IMAGE_DATA_REGEX,
+        max_length=constants.RECIPE_IMAGE_MAX_DATA_LENGTH,
+        error_messages={'invalid': 'Ожидается изображение в base64'}
+    )
 
     class Meta:
         model = Recipe
@@ -167,6 +254,15 @@ class RecipeAddSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def validate_image(self, value):
+        try:
+            verify_image(value)
+        except IMAGE_ERRORS:
+            raise serializers.ValidationError(
+                'Не удалось прочитать изображение'
+            )
+        return value
+
     def validate(self, attrs):
         tags = attrs.get('tags')
         ingredients = attrs.get('ingredients')
@@ -190,29 +286,101 @@ class RecipeAddSerializer(serializers.ModelSerializer):
                 {'ingredients': 'Дублирование ингредиентов'}
             )
 
+        found_tags = Tag.objects.in_bulk(tags)
+        found_ingredients = Ingredient.objects.in_bulk(unique_ingr)
+        errors = {}
+        missing_tags = [pk for pk in tags if pk not in found_tags]
+        if missing_tags:
+            errors['tags'] = f'Несуществующие теги: {missing_tags}'
+        missing_ingredients = [
+            item['id'] for item in ingredients
+            if item['id'] not in found_ingredients
+        ]
+        if missing_ingredients:
+            errors['ingredients'] = (
+                f'Несуществующие ингредиенты: {missing_ingredients}'
+            )
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        attrs['tags'] = [found_tags[pk] for pk in tags]
+        for item in ingredients:
+            item['id'] = found_ingredients[item['id']]
         return attrs
 
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        image = validated_data.pop('image')
         request = self.context.get('request')
-        recipe = Recipe.objects.create(
-            author=request.user,
-            **validated_data
-        )
+        recipe = Recipe(author=request.user, **validated_data)
+        store_image_upload(recipe, image)
+        recipe.save()
         recipe.tags.set(tags)
         self._make_recipe(ingredients, recipe)
+        enqueue_recipe_image(recipe.id)
         return recipe
 
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
+        image = validated_data.pop('image', None)
+        with transaction.atomic():
+            if image:
+                store_image_upload(instance, image)
+                enqueue_recipe_image(instance.id)
+            instance.tags.set(tags)
+            changed_ingredients = self._update_ingredients(
+                ingredients, instance
+            )
+            if changed_ingredients:
+                refresh_shopping_lists(
+                    instance.shopping_carts.values_list('user_id', flat=True),
+                    changed_ingredients
+                )
+            return super().update(instance, validated_data)
 
-        self._make_recipe(ingredients, instance)
-        return super().update(instance, validated_data)
+    @staticmethod
+    def _update_ingredients(ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к переданному списку, записывая
+        только отличия. Возвращает id изменившихся ингредиентов.
+        """
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = existing.keys() - amounts.keys()
+        updated = [
+            recipe_ingredient
+            for ingredient_id, recipe_ingredient in existing.items()
+            if ingredient_id in amounts
+            and recipe_ingredient.amount != amounts[ingredient_id]
+        ]
+        for recipe_ingredient in updated:
+            recipe_ingredient.amount = amounts[recipe_ingredient.ingredient_id]
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'].id not in existing
+        ]
+
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient__in=removed
+            ).delete()
+        if updated:
+            RecipeIngredient.objects.bulk_update(updated, ('amount',))
+        if added:
+            RecipeAddSerializer._make_recipe(added, recipe)
+        return removed | {
+            recipe_ingredient.ingredient_id for recipe_ingredient in updated
+        } | {ingredient['id'].id for ingredient in added}
 
     @staticmethod
     def _make_recipe(ingredients, recipe):
@@ -226,7 +394,18 @@ class RecipeAddSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
-        return RecipeListSerializer(instance, context=self.context).data
+        prefetch_related_objects(
+            (instance,),
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+        return RecipeListSerializer(
+            instance,
+            context={**self.context, 'skip_fragment_cache': True}
+        ).data
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
@@ -238,18 +417,22 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_medium',
+            'image_thumb',
             'cooking_time'
         )
         read_only_fields = (
             'name',
             'image',
+            'image_medium',
+            'image_thumb',
             'cooking_time',
         )
 
 
 class SubscriptionListSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='recipes.count')
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + (
@@ -258,16 +441,11 @@ class SubscriptionListSerializer(UserSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
-
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-            except (ValueError, TypeError):
-                recipes_limit = None
-            recipes = recipes[:recipes_limit]
+        recipes = getattr(obj, 'preview_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context.get('request'))
+            ]
 
         return RecipeMinifiedSerializer(
             recipes,
@@ -275,6 +453,11 @@ class SubscriptionListSerializer(UserSerializer):
             context=self.context
         ).data
 
+    def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.count()
+
 
 class SubscriptionCreateSerializer(serializers.ModelSerializer):
 
@@ -1,15 +1,224 @@
-from django.http import FileResponse
+import csv
+import json
+from collections import defaultdict
 
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
 
-def generate_wishlist_file(ingredients):
-    wishlist = '\n'.join([
-        f'{ingredient["ingredient__name"]}:'
-        f'{ingredient["total_sum"]}'
-        f'{ingredient["ingredient__measurement_unit"]}.'
-        for ingredient in ingredients
-    ])
+from foodgram import constants
+from recipes.models import (
+    FeedEntry,
+    Recipe,
+    RecipeIngredient,
+    ShoppingListItem,
+)
+from users.models import Subscription
 
-    response = FileResponse(wishlist, content_type='text/plain')
-    response['Content-Disposition'] = 'attachment; filename=wishlist.txt'
+from .cache import get_fanin_author_ids
+
+WISHLIST_CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+def get_following_ids(request):
+    """
+    Возвращает множество id авторов, на которых подписан пользователь.
+
+    Множество загружается одним запросом и сохраняется на объекте запроса,
+    поэтому все сериализаторы в рамках запроса используют его повторно.
+    """
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    following_ids = getattr(request, '_following_ids', None)
+    if following_ids is None:
+        following_ids = frozenset(
+            Subscription.objects.filter(
+                user=request.user
+            ).values_list('following_id', flat=True)
+        )
+        request._following_ids = following_ids
+    return following_ids
+
+
+def get_recipes_limit(request):
+    """Возвращает значение параметра recipes_limit или None."""
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (ValueError, TypeError):
+        return None
+    return recipes_limit if recipes_limit > 0 else None
+
+
+def refresh_shopping_lists(user_ids, ingredient_ids=None):
+    """
+    Пересчитывает позиции списков покупок пользователей.
+
+    Если переданы ingredient_ids, пересчитываются только эти ингредиенты.
+    Суммы по корзине собираются одним запросом и записываются upsert'ом,
+    позиции, которых больше нет в корзине, удаляются.
+    """
+    sources = RecipeIngredient.objects.filter(
+        recipe__shopping_carts__user__in=user_ids
+    )
+    items = ShoppingListItem.objects.filter(user__in=user_ids)
+    if ingredient_ids is not None:
+        sources = sources.filter(ingredient__in=ingredient_ids)
+        items = items.filter(ingredient__in=ingredient_ids)
+    with transaction.atomic():
+        totals = [
+            ShoppingListItem(
+                user_id=row['recipe__shopping_carts__user'],
+                ingredient_id=row['ingredient'],
+                total_amount=row['total_amount'],
+                recipe_count=row['recipe_count'],
+            )
+            for row in sources.values(
+                'recipe__shopping_carts__user', 'ingredient'
+            ).annotate(
+                total_amount=Sum('amount'),
+                recipe_count=Count('recipe', distinct=True),
+            ).order_by()
+        ]
+        actual = {(item.user_id, item.ingredient_id) for item in totals}
+        items.filter(pk__in=[
+            pk for pk, user_id, ingredient_id in items.values_list(
+                'pk', 'user_id', 'ingredient_id'
+            )
+            if (user_id, ingredient_id) not in actual
+        ]).delete()
+        ShoppingListItem.objects.bulk_create(
+            totals,
+            update_conflicts=True,
+            unique_fields=('user', 'ingredient'),
+            update_fields=('total_amount', 'recipe_count'),
+        )
+
+
+def fan_out_recipes(recipes):
+    """
+    Раскладывает рецепты по лентам подписчиков их авторов.
+
+    Рецепты авторов с fan-in (get_fanin_author_ids) пропускаются:
+    они подмешиваются в ленту при чтении.
+    """
+    fanin_author_ids = get_fanin_author_ids()
+    recipes_by_author = defaultdict(list)
+    for recipe in recipes:
+        if recipe.author_id not in fanin_author_ids:
+            recipes_by_author[recipe.author_id].append(recipe)
+    if not recipes_by_author:
+        return
+    followers = Subscription.objects.filter(
+        following__in=recipes_by_author
+    ).values_list('user_id', 'following_id')
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe.id,
+                author_id=author_id,
+                pub_date=recipe.pub_date,
+            )
+            for user_id, author_id in followers.iterator()
+            for recipe in recipes_by_author[author_id]
+        ),
+        batch_size=constants.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту пользователя уже опубликованные рецепты автора."""
+    if author_id in get_fanin_author_ids():
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id
+            ).values_list('id', 'pub_date').iterator()
+        ),
+        batch_size=constants.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_feeds(user_ids):
+    """Пересобирает ленты пользователей по их текущим подпискам."""
+    with transaction.atomic():
+        FeedEntry.objects.filter(user__in=user_ids).delete()
+        for user_id, author_id in Subscription.objects.filter(
+            user__in=user_ids
+        ).values_list('user_id', 'following_id'):
+            backfill_feed(user_id, author_id)
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def wishlist_txt(ingredients):
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["ingredient__name"]}:'
+            f'{ingredient["total_sum"]}'
+            f'{ingredient["ingredient__measurement_unit"]}.\n'
+        )
+
+
+def wishlist_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['total_sum'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def wishlist_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'amount': ingredient['total_sum'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+WISHLIST_GENERATORS = {
+    'txt': wishlist_txt,
+    'csv': wishlist_csv,
+    'json': wishlist_json,
+}
+
+
+def generate_wishlist_file(ingredients, file_format='txt'):
+    """
+    Отдаёт список покупок потоком в формате txt, csv или json,
+    не собирая весь файл в памяти.
+    """
+    response = StreamingHttpResponse(
+        WISHLIST_GENERATORS[file_format](ingredients),
+        content_type=WISHLIST_CONTENT_TYPES[file_format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=wishlist.{file_format}'
+    )
 
     return response
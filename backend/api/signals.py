@@ -0,0 +1,167 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from recipes.models import (
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription, User
+
+from .cache import (
+    invalidate_ingredient_index,
+    invalidate_recipes,
+    invalidate_reference_payload,
+    invalidate_tag_catalog,
+)
+from .search import ingredient_index
+from .services import (
+    backfill_feed,
+    fan_out_recipes,
+    refresh_shopping_lists,
+)
+
+AUTHOR_FIELDS = frozenset(('username', 'first_name', 'last_name', 'email'))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipes((instance.id,))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    invalidate_recipes((instance.recipe_id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_relations(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_recipes((instance.id,))
+    elif pk_set:
+        invalidate_recipes(pk_set)
+    else:
+        invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def invalidate_related_recipes(sender, instance, **kwargs):
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags_payload(sender, **kwargs):
+    invalidate_reference_payload('tags')
+    invalidate_tag_catalog()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients_payload(sender, **kwargs):
+    invalidate_reference_payload('ingredients')
+    invalidate_ingredient_index()
+    ingredient_index.expire()
+
+
+def is_recipe_deletion(origin):
+    """Удаление запущено удалением рецепта (объекта или выборки)."""
+    return isinstance(origin, Recipe) or getattr(
+        origin, 'model', None
+    ) is Recipe
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        refresh_shopping_lists(
+            (instance.user_id,),
+            RecipeIngredient.objects.filter(
+                recipe_id=instance.recipe_id
+            ).values_list('ingredient_id', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remember_shopping_list_ingredients(sender, instance, origin=None,
+                                       **kwargs):
+    if is_recipe_deletion(origin):
+        return
+    instance._ingredient_ids = list(
+        RecipeIngredient.objects.filter(
+            recipe_id=instance.recipe_id
+        ).values_list('ingredient_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, origin=None, **kwargs):
+    if is_recipe_deletion(origin):
+        return
+    refresh_shopping_lists(
+        (instance.user_id,), getattr(instance, '_ingredient_ids', None)
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_shopping_lists(sender, instance, **kwargs):
+    instance._cart_user_ids = list(
+        instance.shopping_carts.values_list('user_id', flat=True)
+    )
+    if instance._cart_user_ids:
+        instance._ingredient_ids = list(
+            instance.recipe.values_list('ingredient_id', flat=True)
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def refresh_deleted_recipe_shopping_lists(sender, instance, **kwargs):
+    """
+    Один пересчёт списков покупок на удаление рецепта вместо пересчёта
+    на каждую каскадно удалённую строку корзины.
+    """
+    user_ids = getattr(instance, '_cart_user_ids', None)
+    if user_ids:
+        refresh_shopping_lists(user_ids, instance._ingredient_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipes((instance,))
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_subscription_feed(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_subscription_feed(sender, instance, **kwargs):
+    FeedEntry.objects.filter(
+        user_id=instance.user_id, author_id=instance.following_id
+    ).delete()
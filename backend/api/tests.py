@@ -0,0 +1,743 @@
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from base64 import b64encode
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from foodgram.constants import INGREDIENT_INDEX_CHECK_INTERVAL
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    ShoppingListItem,
+    Tag,
+)
+from users.models import Subscription, User
+
+from .cache import get_recipe_version
+from .images import process_recipe_image, store_image_upload
+from .importers import RecipeImporter
+from .metrics import ARCHIVE_NAME, MetricsRegistry, empty_series
+from .search import ingredient_index
+
+
+class APITestCase(TestCase):
+    """Общие данные для тестов API: пользователи, теги и ингредиенты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(30)
+        )
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.expire()
+        self.client = APIClient()
+
+    @classmethod
+    def create_recipe(cls, name='Рецепт', author=None, ingredients=None,
+                      tags=None):
+        recipe = Recipe.objects.create(
+            author=author or cls.author,
+            name=name,
+            text='Описание',
+            image='recipes/image.jpg',
+            cooking_time=10,
+        )
+        recipe.tags.set(cls.tags[:1] if tags is None else tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in (
+                cls.ingredients[:3] if ingredients is None else ingredients
+            )
+        )
+        return recipe
+
+
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    def setUp(self):
+        super().setUp()
+        for number in range(6):
+            self.create_recipe(
+                name=f'Рецепт {number}', ingredients=self.ingredients
+            )
+        # На PostgreSQL перед COUNT выполняется EXPLAIN для оценки.
+        self.count_queries = 1 + (connection.vendor == 'postgresql')
+
+    def test_anonymous_list_query_count(self):
+        # Каталог тегов, COUNT, рецепты, теги, ингредиенты.
+        with self.assertNumQueries(4 + self.count_queries):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(
+            len(response.data['results'][0]['ingredients']),
+            len(self.ingredients)
+        )
+
+    def test_authenticated_list_query_count(self):
+        self.client.force_authenticate(self.reader)
+        # Плюс подписки пользователя для is_subscribed.
+        with self.assertNumQueries(5 + self.count_queries):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_cached_count_and_catalog_are_reused(self):
+        self.client.get('/api/recipes/')
+        # Рецепты, теги, ингредиенты.
+        with self.assertNumQueries(3):
+            self.client.get('/api/recipes/')
+
+
+class ServerTimingTest(APITestCase):
+    """Server-Timing разделяет время сериализаторов и рендеринга."""
+
+    def test_serializer_time_is_reported(self):
+        self.create_recipe()
+        response = self.client.get('/api/recipes/')
+        timings = dict(
+            part.split(';dur=')[0:2]
+            for part in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(
+            set(timings), {'db', 'serialize', 'render', 'app', 'total'}
+        )
+        self.assertGreater(float(timings['serialize']), 0)
+
+
+class RecipeFragmentCacheTest(APITestCase):
+    """Закешированный рецепт не хранит ссылки, зависящие от запроса."""
+
+    def test_image_url_uses_current_host(self):
+        recipe = self.create_recipe()
+        url = f'/api/recipes/{recipe.id}/'
+        with self.settings(ALLOWED_HOSTS=['*']):
+            first = self.client.get(url, HTTP_HOST='first.example')
+            second = self.client.get(url, HTTP_HOST='second.example')
+        self.assertTrue(
+            first.data['image'].startswith('http://first.example/')
+        )
+        self.assertTrue(
+            second.data['image'].startswith('http://second.example/')
+        )
+        self.assertEqual(first.data['name'], second.data['name'])
+
+    def test_version_is_reset_after_commit(self):
+        recipe = self.create_recipe()
+        url = f'/api/recipes/{recipe.id}/'
+        self.client.get(url)
+        version = get_recipe_version(recipe.id)
+        self.client.force_authenticate(self.author)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(url, {
+                'name': 'Новое название',
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 10}
+                ],
+            }, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(get_recipe_version(recipe.id), version)
+        for callback in callbacks:
+            callback()
+
+        self.assertNotEqual(get_recipe_version(recipe.id), version)
+        self.assertEqual(
+            self.client.get(url).data['name'], 'Новое название'
+        )
+
+
+class ReferencePayloadTest(APITestCase):
+    """Собранные ответы справочников следят за данными в БД."""
+
+    def test_bulk_insert_without_signals_refreshes_payload(self):
+        first = self.client.get('/api/tags/')
+        Tag.objects.bulk_create([
+            Tag(name='Новый', color='#123456', slug='new')
+        ])
+        second = self.client.get('/api/tags/')
+        self.assertEqual(len(second.json()), len(first.json()) + 1)
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_gzip_and_identity_have_distinct_etags(self):
+        identity = self.client.get('/api/ingredients/')
+        compressed = self.client.get(
+            '/api/ingredients/', HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertNotEqual(identity['ETag'], compressed['ETag'])
+        not_modified = self.client.get(
+            '/api/ingredients/',
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=compressed['ETag'],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        identity_again = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=compressed['ETag']
+        )
+        self.assertEqual(identity_again.status_code, 200)
+
+
+class IngredientSearchTest(APITestCase):
+    """Автодополнение ингредиентов видит загрузки мимо сигналов."""
+
+    def search(self):
+        response = self.client.get('/api/ingredients/?name=сол')
+        return [item['name'] for item in response.json()]
+
+    @patch('api.search.monotonic')
+    def test_bulk_insert_without_signals_is_found(self, monotonic):
+        monotonic.return_value = 1000.0
+        self.assertEqual(self.search(), [])
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Соль', measurement_unit='г'),
+            Ingredient(name='Фасоль', measurement_unit='г'),
+        ])
+        # Версия индекса сверяется не чаще раза в интервал.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search(), [])
+
+        monotonic.return_value += INGREDIENT_INDEX_CHECK_INTERVAL
+        self.assertEqual(self.search(), ['Соль', 'Фасоль'])
+
+
+class ShoppingCartDownloadTest(APITestCase):
+    """Скачивание списка покупок."""
+
+    def test_errors_are_json(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
+
+    def test_default_format_is_text(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+class ShoppingListAggregateTest(APITestCase):
+    """Список покупок поддерживается при изменении корзины."""
+
+    def totals(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.reader).values_list(
+                'ingredient__name', 'total_amount'
+            )
+        )
+
+    def test_cart_changes_update_totals(self):
+        first = self.create_recipe(ingredients=self.ingredients[:2])
+        second = self.create_recipe(ingredients=self.ingredients[1:3])
+        self.client.force_authenticate(self.reader)
+
+        self.client.post(f'/api/recipes/{first.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{second.id}/shopping_cart/')
+        self.assertEqual(self.totals(), {
+            'Ингредиент 0': 10, 'Ингредиент 1': 20, 'Ингредиент 2': 10,
+        })
+
+        self.client.delete(f'/api/recipes/{first.id}/shopping_cart/')
+        self.assertEqual(self.totals(), {
+            'Ингредиент 1': 10, 'Ингредиент 2': 10,
+        })
+
+        response = self.client.get('/api/recipes/shopping_cart_totals/')
+        self.assertEqual(
+            [(item['name'], item['amount']) for item in response.data],
+            [('Ингредиент 1', 10), ('Ингредиент 2', 10)]
+        )
+
+
+class RecipeUpdateTest(APITestCase):
+    """Правка рецепта записывает только изменившиеся ингредиенты."""
+
+    def test_ingredients_are_updated_as_diff(self):
+        recipe = self.create_recipe(ingredients=self.ingredients[:3])
+        kept, changed, removed = RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).order_by('ingredient_id')
+        ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        self.client.force_authenticate(self.author)
+
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {
+                'tags': [tag.id for tag in self.tags[1:]],
+                'ingredients': [
+                    {'id': kept.ingredient_id, 'amount': kept.amount},
+                    {'id': changed.ingredient_id, 'amount': 25},
+                    {'id': self.ingredients[5].id, 'amount': 5},
+                ],
+            },
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        self.assertEqual(rows[kept.ingredient_id].pk, kept.pk)
+        self.assertEqual(rows[changed.ingredient_id].pk, changed.pk)
+        self.assertEqual(rows[changed.ingredient_id].amount, 25)
+        self.assertNotIn(removed.ingredient_id, rows)
+        self.assertIn(self.ingredients[5].id, rows)
+        self.assertEqual(
+            set(recipe.tags.values_list('id', flat=True)),
+            {tag.id for tag in self.tags[1:]}
+        )
+        self.assertEqual(
+            dict(ShoppingListItem.objects.filter(
+                user=self.reader
+            ).values_list('ingredient_id', 'total_amount')),
+            {
+                kept.ingredient_id: kept.amount,
+                changed.ingredient_id: 25,
+                self.ingredients[5].id: 5,
+            }
+        )
+
+
+class RecipeWriteQueriesTest(APITestCase):
+    """
+    Правка и удаление рецепта из корзины пересчитывают список покупок
+    один раз, а не на каждую строку ингредиента.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(ingredients=self.ingredients)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        self.client.force_authenticate(self.author)
+
+    def test_patch_dropping_ingredients(self):
+        with self.assertNumQueries(21):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {
+                    'tags': [self.tags[0].id],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': 10}
+                        for ingredient in self.ingredients[:5]
+                    ],
+                },
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            ShoppingListItem.objects.filter(user=self.reader).count(), 5
+        )
+
+    def test_delete(self):
+        with self.assertNumQueries(19):
+            response = self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            ShoppingListItem.objects.filter(user=self.reader).exists()
+        )
+
+
+def make_image_data(size=(40, 30)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+class RecipeImageTest(APITestCase):
+    """Загрузка и фоновая обработка изображений рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_ASYNC=False
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_authenticate(self.author)
+
+    def post_recipe(self, image):
+        return self.client.post('/api/recipes/', {
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}],
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': image,
+        }, format='json')
+
+    def test_undecodable_image_is_rejected(self):
+        response = self.post_recipe('data:image/png;base64,AAAA')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_image_variants_are_saved(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_recipe(make_image_data())
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get()
+        self.assertFalse(recipe.image_processing)
+        self.assertFalse(recipe.image_failed)
+        self.assertTrue(recipe.image)
+        self.assertTrue(recipe.image_thumb)
+        self.assertFalse(recipe.image_upload)
+        self.assertEqual(
+            list(Path(self.media_root, 'recipes', 'uploads').iterdir()), []
+        )
+
+    def test_pending_uploads_are_processed_after_restart(self):
+        pending = self.create_recipe()
+        store_image_upload(pending, make_image_data())
+        pending.save()
+        lost = self.create_recipe()
+        Recipe.objects.filter(pk=lost.pk).update(
+            image='', image_processing=True
+        )
+
+        call_command('process_pending_images', stdout=StringIO())
+
+        pending.refresh_from_db()
+        self.assertFalse(pending.image_processing)
+        self.assertFalse(pending.image_upload)
+        self.assertTrue(pending.image_thumb)
+        lost.refresh_from_db()
+        self.assertFalse(lost.image_processing)
+        self.assertTrue(lost.image_failed)
+
+    def test_failed_processing_is_recorded(self):
+        recipe = self.create_recipe()
+        store_image_upload(recipe, 'data:image/png;base64,AAAA')
+        recipe.save()
+        with self.assertLogs('api.images', 'ERROR'):
+            process_recipe_image(recipe.id)
+        recipe.refresh_from_db()
+        self.assertFalse(recipe.image_processing)
+        self.assertTrue(recipe.image_failed)
+        self.assertEqual(recipe.image.name, 'recipes/image.jpg')
+
+    def test_backfill_keeps_original_image(self):
+        recipe = self.create_recipe()
+        Image.new('RGB', (50, 50), 'blue').save(
+            f'{self.media_root}/original.png'
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(image='original.png')
+        call_command('generate_image_variants', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'original.png')
+        self.assertTrue(recipe.image_medium)
+        self.assertTrue(recipe.image_thumb)
+
+
+class TagFilterTest(APITestCase):
+    """Фильтр рецептов по слагам тегов."""
+
+    def test_tag_added_without_signals_is_accepted(self):
+        response = self.client.get('/api/recipes/', {'tags': 'tag0'})
+        self.assertEqual(response.status_code, 200)
+        tag = Tag.objects.bulk_create([
+            Tag(name='Новый', color='#00000A', slug='new')
+        ])[0]
+        recipe = self.create_recipe(tags=[tag])
+
+        response = self.client.get('/api/recipes/', {'tags': 'new'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']],
+            [recipe.pk]
+        )
+        response = self.client.get('/api/recipes/', {'tags': 'missing'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeSearchTest(APITestCase):
+    """Поиск рецептов по ?search=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.in_text = cls.create_recipe('Суп')
+        Recipe.objects.filter(pk=cls.in_text.pk).update(
+            text='Борщ по-домашнему'
+        )
+        cls.in_name = cls.create_recipe('Борщ')
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_matches_rank_higher(self):
+        self.assertEqual(
+            self.search('борщ'), [self.in_name.pk, self.in_text.pk]
+        )
+
+    def test_unsupported_database_falls_back_to_substring(self):
+        with patch.object(connection, 'vendor', 'other'):
+            self.assertEqual(
+                self.search('Борщ'), [self.in_name.pk, self.in_text.pk]
+            )
+            self.assertEqual(self.search('пицца'), [])
+
+
+class RecipeImportTest(APITestCase):
+    """Импорт NDJSON: изображение задаётся путём к файлу в хранилище."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Path(media_root, 'recipes').mkdir()
+        Path(media_root, 'recipes', 'soup.png').write_bytes(b'png')
+
+    def line(self, image):
+        return json.dumps({
+            'name': 'Суп',
+            'text': 'Сварить',
+            'cooking_time': 10,
+            'image': image,
+            'tags': ['tag0'],
+            'ingredients': [{
+                'name': 'Ингредиент 0', 'measurement_unit': 'г',
+                'amount': 100,
+            }],
+        })
+
+    def test_image_must_be_existing_storage_path(self):
+        result = RecipeImporter(default_author=self.author).run([
+            self.line('recipes/soup.png'),
+            self.line(make_image_data()),
+            self.line('recipes/missing.png'),
+            self.line('recipes/' + 'x' * 200 + '.png'),
+            self.line('../soup.png'),
+        ])
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(
+            [(error['line'], list(error['errors'])) for error in result[
+                'errors'
+            ]],
+            [(line, ['image']) for line in range(2, 6)]
+        )
+        self.assertEqual(
+            Recipe.objects.get(name='Суп').image.name, 'recipes/soup.png'
+        )
+
+
+class LoadIngredientsTest(APITestCase):
+    """Загрузка ингредиентов видна API без сброса кеша."""
+
+    @patch('foodgram.constants.INGREDIENT_INDEX_CHECK_INTERVAL', 0)
+    def test_loaded_ingredients_are_served(self):
+        self.client.get('/api/ingredients/')
+        self.client.get('/api/ingredients/?name=перец')
+        path = Path(tempfile.mkdtemp()) / 'ingredients.csv'
+        self.addCleanup(shutil.rmtree, path.parent, True)
+        path.write_text('перец черный,г\nперец чили,шт\n', encoding='utf-8')
+        # Сброс кеша из отдельного процесса до веб-процесса не доходит.
+        with patch(
+            'recipes.management.commands.load_ingredients'
+            '.invalidate_reference_payload'
+        ), patch(
+            'recipes.management.commands.load_ingredients'
+            '.invalidate_ingredient_index'
+        ):
+            call_command('load_ingredients', path=path, stdout=StringIO())
+
+        names = [item['name'] for item in self.client.get(
+            '/api/ingredients/'
+        ).json()]
+        self.assertIn('перец чили', names)
+        found = self.client.get('/api/ingredients/?name=перец').json()
+        self.assertEqual(len(found), 2)
+
+
+class FeedTest(APITestCase):
+    """Лента подписок: fan-out, fan-in и постраничный обход."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.reader)
+        self.other = User.objects.create_user(
+            username='other', email='other@example.com',
+            first_name='Другой', last_name='Автор', password='password'
+        )
+
+    def feed(self, **params):
+        response = self.client.get('/api/recipes/feed/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def feed_ids(self):
+        return [recipe['id'] for recipe in self.feed()['results']]
+
+    def subscribe(self, author):
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+
+    def test_subscription_backfills_and_new_recipes_fan_out(self):
+        old = self.create_recipe('Старый')
+        self.create_recipe('Чужой', author=self.other)
+        self.subscribe(self.author)
+        self.assertEqual(self.feed_ids(), [old.pk])
+
+        new = self.create_recipe('Новый')
+        self.assertEqual(self.feed_ids(), [new.pk, old.pk])
+
+    def test_unsubscribe_removes_author_recipes(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        self.create_recipe('Автора')
+        other = self.create_recipe('Другого', author=self.other)
+
+        response = self.client.delete(
+            f'/api/users/{self.author.pk}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.feed_ids(), [other.pk])
+
+    def test_pages_follow_cursor_without_gaps(self):
+        self.subscribe(self.author)
+        recipes = [
+            self.create_recipe(f'Рецепт {number}') for number in range(5)
+        ]
+        expected = [recipe.pk for recipe in reversed(recipes)]
+
+        seen = []
+        page = self.feed(limit=2)
+        while True:
+            seen.extend(recipe['id'] for recipe in page['results'])
+            if page['next'] is None:
+                break
+            page = self.client.get(page['next']).json()
+        self.assertEqual(seen, expected)
+
+    def test_popular_author_recipes_are_merged_on_read(self):
+        Subscription.objects.create(user=self.other, following=self.author)
+        with patch('foodgram.constants.FEED_FANOUT_LIMIT', 1):
+            self.subscribe(self.author)
+            self.subscribe(self.other)
+            # Набор авторов с fan-in кешируется на FEED_FANIN_CACHE_TIMEOUT.
+            cache.clear()
+            old = self.create_recipe('Старый', author=self.other)
+            popular = [
+                self.create_recipe(f'Рецепт {number}') for number in range(3)
+            ]
+            self.assertEqual(
+                list(self.reader.feed_entries.values_list(
+                    'recipe_id', flat=True
+                )),
+                [old.pk]
+            )
+            page = self.feed(limit=2)
+            self.assertEqual(
+                [recipe['id'] for recipe in page['results']],
+                [popular[2].pk, popular[1].pk]
+            )
+            page = self.client.get(page['next']).json()
+            self.assertEqual(
+                [recipe['id'] for recipe in page['results']],
+                [popular[0].pk, old.pk]
+            )
+
+
+class MetricsRegistryTest(TestCase):
+    """Файлы метрик процессов и их архив."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def make_registry(self):
+        registry = MetricsRegistry()
+        self.addCleanup(atexit.unregister, registry.close)
+        return registry
+
+    def dead_pid(self):
+        process = subprocess.run(
+            (sys.executable, '-c', 'import os; print(os.getpid())'),
+            capture_output=True, check=True, text=True
+        )
+        return int(process.stdout)
+
+    def requests_total(self, registry):
+        return {
+            key: series['requests']
+            for key, series in registry.collect().items()
+        }
+
+    def test_close_flushes_recorded_requests(self):
+        self.make_registry().record('recipe-list', 'GET', 200, 0.01, 3)
+        self.assertEqual(os.listdir(self.directory), [])
+        writer = self.make_registry()
+        writer.record('recipe-list', 'GET', 200, 0.01, 3)
+        writer.close()
+        self.assertEqual(
+            self.requests_total(self.make_registry()),
+            {('recipe-list', 'GET'): 1}
+        )
+
+    def test_dead_process_files_are_archived(self):
+        series = empty_series()
+        series['requests'] = 7
+        Path(self.directory, f'{self.dead_pid()}-old.json').write_text(
+            json.dumps([['recipe-list', 'GET', series]])
+        )
+        registry = self.make_registry()
+        registry.record('recipe-list', 'GET', 200, 0.01, 3)
+
+        self.assertEqual(
+            self.requests_total(registry), {('recipe-list', 'GET'): 8}
+        )
+        self.assertEqual(
+            self.requests_total(registry), {('recipe-list', 'GET'): 8}
+        )
+        self.assertEqual(
+            sorted(
+                name for name in os.listdir(self.directory)
+                if name.endswith('.json')
+            ),
+            sorted((ARCHIVE_NAME, f'{os.getpid()}-{registry._token}.json'))
+        )
@@ -4,6 +4,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet,
     IngredientViewSet,
+    MetricsView,
     RecipeViewSet,
     TagViewSet,
 )
@@ -18,6 +19,7 @@ v1_router.register('recipes', RecipeViewSet)
 v1_router.register('users', UserViewSet)
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(v1_router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
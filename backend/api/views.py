@@ -1,38 +1,58 @@
-from django.db.models import Sum
+from django.db.models import Count, F, Prefetch
+from django.http import HttpResponse
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from foodgram.constants import WISHLIST_CHUNK_SIZE
 from users.models import User
 from recipes.models import (
-    FavoriteRecipe, Ingredient,
+    FavoriteRecipe, FeedEntry, Ingredient,
     Recipe, RecipeIngredient,
-    ShoppingCart, Tag
+    ShoppingCart, ShoppingListItem, Tag
 )
-from .services import generate_wishlist_file
+
+from .cache import get_fanin_author_ids
 from .filters import IngredientSearchFilter, RecipeFilterBackend
-from .paginators import PageLimitPagination
+from .importers import RecipeImporter
+from .metrics import registry
+from .middleware import time_serialization
+from .mixins import CachedListMixin, SerializeTimingMixin
+from .paginators import (
+    CachedCountPagination,
+    FeedPagination,
+    KeysetPagination,
+)
 from .permissions import AuthorOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (
     UserSerializer, FavoriteRecipeSerializer,
     IngredientSerializer, RecipeAddSerializer,
     RecipeListSerializer, ShoppingCartSerializer,
-    SubscriptionCreateSerializer,
+    ShoppingListItemSerializer, SubscriptionCreateSerializer,
     SubscriptionListSerializer, TagSerializer
 )
+from .services import (
+    generate_wishlist_file,
+    get_following_ids,
+    get_recipes_limit,
+)
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(SerializeTimingMixin, UserViewSet):
     """Вьюсет юзера."""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    pagination_class = PageLimitPagination
+    pagination_class = CachedCountPagination
 
     def get_permissions(self):
         if self.action == 'me':
@@ -45,15 +65,20 @@ class UserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscriptions(self, request, pk=None):
+        recipes = Recipe.objects.all()[:get_recipes_limit(request)]
         queryset = User.objects.filter(
             following__user=self.request.user
-        )
+        ).annotate(
+            recipes_count=Count('recipes')
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='preview_recipes')
+        ).order_by(*User._meta.ordering)
         pages = self.paginate_queryset(queryset)
-        serializer = SubscriptionListSerializer(
+        serializer = time_serialization(request, SubscriptionListSerializer(
             pages,
             many=True,
             context={'request': request}
-        )
+        ))
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -89,18 +114,35 @@ class UserViewSet(UserViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class MetricsView(APIView):
+    """Агрегированные метрики API в формате Prometheus."""
+
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class TagViewSet(CachedListMixin, SerializeTimingMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Вьюсет тега."""
 
+    cache_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedListMixin, SerializeTimingMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет ингридиента."""
 
+    cache_name = 'ingredients'
     queryset = Ingredient.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
     serializer_class = IngredientSerializer
@@ -109,22 +151,83 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SerializeTimingMixin, viewsets.ModelViewSet):
     """Вьюсет рецепта."""
 
     queryset = Recipe.objects.all().select_related('author').prefetch_related(
-        'tags', 'ingredients'
+        'tags',
+        Prefetch(
+            'recipe',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        )
     )
     filterset_class = RecipeFilterBackend
     serializer_class = RecipeListSerializer
-    pagination_class = PageLimitPagination
+    pagination_class = CachedCountPagination
     permission_classes = (AuthorOrReadOnly,)
 
+    @property
+    def paginator(self):
+        """
+        Переключает список на пагинацию по ключу, если в запросе
+        передан параметр cursor (пустой для первой страницы).
+        """
+        cursor_param = KeysetPagination.cursor_query_param
+        if cursor_param in self.request.query_params:
+            self.pagination_class = KeysetPagination
+        return super().paginator
+
+    def get_queryset(self):
+        return super().get_queryset().with_user_flags(self.request.user)
+
+    def handle_exception(self, exc):
+        """
+        Отдаёт ошибки в JSON, даже если для ответа был выбран
+        текстовый формат (txt или csv списка покупок).
+        """
+        response = super().handle_exception(exc)
+        if isinstance(
+            getattr(self.request, 'accepted_renderer', None),
+            (PlainTextRenderer, CSVRenderer)
+        ):
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return response
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrive'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeListSerializer
         return RecipeAddSerializer
 
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь.
+
+        Основная часть читается из FeedEntry диапазоном по индексу
+        (user, -pub_date, -recipe); рецепты авторов с fan-in подмешиваются
+        выборкой по индексу (author, -pub_date).
+        """
+        fanin_author_ids = get_fanin_author_ids() & get_following_ids(
+            request
+        )
+        fanin_recipes = Recipe.objects.filter(
+            author__in=fanin_author_ids
+        ) if fanin_author_ids else None
+        paginator = FeedPagination()
+        page = paginator.paginate_feed(
+            self.get_queryset(),
+            FeedEntry.objects.filter(user=request.user),
+            fanin_recipes,
+            request
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @staticmethod
     def add_method(serializer, request, pk):
         serializer = serializer(
@@ -183,13 +286,47 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=('get',),
         url_path='download_shopping_cart',
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer)
     )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_carts__user=request.user
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            total_sum=F('total_amount')
+        ).order_by(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(total_sum=Sum('amount')).order_by('total_sum')
+        ).iterator(chunk_size=WISHLIST_CHUNK_SIZE)
+
+        return generate_wishlist_file(
+            ingredients, request.accepted_renderer.format
+        )
+
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_totals(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        serializer = time_serialization(
+            request, ShoppingListItemSerializer(items, many=True)
+        )
+        return Response(serializer.data)
 
-        return generate_wishlist_file(ingredients)
+    @action(
+        methods=('post',),
+        url_path='import',
+        detail=False,
+        permission_classes=(IsAdminUser,)
+    )
+    def import_recipes(self, request):
+        """Импорт рецептов из тела запроса в формате NDJSON."""
+        stream = request.stream
+        lines = iter(stream.readline, b'') if stream is not None else ()
+        result = RecipeImporter(default_author=request.user).run(lines)
+        return Response(result)
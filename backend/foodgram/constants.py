@@ -21,3 +21,33 @@ COOKING_TIME_MAX_VALUE = AMOUNT_MAХ_VALUE = 32000
 NAME_LENGTH = 20
 INGREDIENT_MAX = 2147483647
 INGREDIENT_MIN = 1
+
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+REFERENCE_CACHE_MAX_AGE = 60 * 5
+REFERENCE_PAYLOAD_TIMEOUT = 60 * 5
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TIMEOUT = 60 * 5
+INGREDIENT_INDEX_CHECK_INTERVAL = 5
+KEYSET_MAX_PAGE_SIZE = 100
+COUNT_CACHE_TIMEOUT = 30
+TAG_CATALOG_TIMEOUT = 60
+WISHLIST_CHUNK_SIZE = 2000
+
+RECIPE_IMAGE_DATA_REGEX = r'^data:image/(jpeg|jpg|png|gif|webp);base64,'
+RECIPE_IMAGE_MAX_DATA_LENGTH = 30 * 1024 * 1024
+RECIPE_IMAGE_MAX_SIZE = 1280
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_MEDIUM_SIZE = 640
+RECIPE_IMAGE_THUMB_SIZE = 320
+
+INGREDIENT_IMPORT_BATCH_SIZE = 1000
+INGREDIENT_COPY_THRESHOLD = 10 * 1024 * 1024
+RECIPE_IMPORT_CHUNK_SIZE = 500
+METRICS_FLUSH_INTERVAL = 5
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_NAME_WEIGHT = 10.0
+RECIPE_SEARCH_TEXT_WEIGHT = 1.0
+FEED_FANOUT_LIMIT = 1000
+FEED_BATCH_SIZE = 1000
+FEED_FANIN_CACHE_TIMEOUT = 300
+QUERY_PLAN_SEQ_SCAN_MIN_ROWS = 1000
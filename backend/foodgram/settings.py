@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from django.core.management.utils import get_random_secret_key
 from pathlib import Path
@@ -36,6 +37,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +87,61 @@ else:
         }
     }
 
+if os.getenv('DJANGO_SERVER_TYPE') == 'prod':
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.filebased.FileBasedCache'
+            ),
+            'LOCATION': os.getenv(
+                'CACHE_LOCATION',
+                os.path.join(tempfile.gettempdir(), 'foodgram-cache')
+            ),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.locmem.LocMemCache'
+            ),
+            'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        }
+    }
+
+# Файловый и локальный кеши при переполнении удаляют треть записей.
+# На рецепт приходится две записи (версия и представление), плюс
+# справочники и служебные ключи, поэтому лимит должен покрывать весь
+# каталог рецептов. Остальным бэкендам OPTIONS передаются в клиент.
+if CACHES['default']['BACKEND'] in (
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+    }
+
+INGREDIENT_INDEX_ENABLED = (
+    os.getenv('INGREDIENT_INDEX_ENABLED', 'True') == 'True'
+)
+
+COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('COUNT_ESTIMATE_THRESHOLD', 100000)
+)
+
+IMAGE_PROCESSING_ASYNC = (
+    os.getenv('IMAGE_PROCESSING_ASYNC', 'True') == 'True'
+)
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+API_QUERY_BUDGET = int(os.getenv('API_QUERY_BUDGET', 30))
+
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram-metrics')
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -129,6 +186,27 @@ REST_FRAMEWORK = {
 }
 
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ('console',),
+            'level': os.getenv(
+                'API_LOG_LEVEL',
+                'INFO' if os.getenv('DJANGO_SERVER_TYPE') == 'prod'
+                else 'WARNING'
+            ),
+        },
+    },
+}
+
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
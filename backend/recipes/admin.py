@@ -1,12 +1,16 @@
 from django.contrib import admin
 
+from api.services import refresh_shopping_lists
+
 from .models import (
+    FeedEntry,
     Ingredient,
     FavoriteRecipe,
     RecipeIngredient,
     Recipe,
     Tag,
-    ShoppingCart
+    ShoppingCart,
+    ShoppingListItem
 )
 
 
@@ -33,6 +37,15 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     inlines = (IngredientInline,)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            refresh_shopping_lists(
+                form.instance.shopping_carts.values_list(
+                    'user_id', flat=True
+                )
+            )
+
     @admin.display(description='В избранном')
     def added_in_favorites(self, obj):
         return obj.favorite_recipes.count()
@@ -72,3 +85,17 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_filter = ('user', 'recipe')
     search_fields = ('user',)
     empty_value_display = '-пусто-'
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'total_amount', 'recipe_count')
+    list_filter = ('user',)
+    search_fields = ('user__username', 'ingredient__name')
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipe', 'author', 'pub_date')
+    list_filter = ('user',)
+    search_fields = ('user__username', 'recipe__name')
@@ -0,0 +1,118 @@
+"""
+Команда для замера фильтров списка рецептов.
+"""
+from statistics import median
+from time import perf_counter
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.http import QueryDict
+
+from api.filters import RecipeFilterBackend
+from foodgram.constants import PAGE_SIZE_PAGINATORS
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Прогоняет фильтры RecipeFilterBackend по отдельности и вместе
+    на текущих данных (например, после generate_data) и печатает
+    число строк, дубликаты, время COUNT и первой страницы.
+
+    С флагом --explain для каждого случая выводится план запроса
+    первой страницы.
+    """
+
+    help = 'Замер фильтров списка рецептов на текущих данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='id пользователя; по умолчанию самый активный'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--explain', action='store_true')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:3])
+        if not slugs:
+            raise CommandError('В базе нет тегов')
+
+        self.stdout.write(f'Пользователь: {user.pk}')
+        for name, params in self.get_cases(slugs).items():
+            queryset = self.filter(params, user)
+            ids = list(queryset.values_list('id', flat=True))
+            count_times = self.measure(queryset.count, options['repeat'])
+            page_times = self.measure(
+                lambda: list(queryset[:PAGE_SIZE_PAGINATORS]),
+                options['repeat']
+            )
+            self.stdout.write(
+                f'{name}: rows={len(ids)} '
+                f'duplicates={len(ids) - len(set(ids))} '
+                f'count p50={median(count_times):.2f}ms '
+                f'max={max(count_times):.2f}ms '
+                f'page p50={median(page_times):.2f}ms '
+                f'max={max(page_times):.2f}ms'
+            )
+            if options['explain']:
+                self.stdout.write(
+                    queryset[:PAGE_SIZE_PAGINATORS].explain()
+                )
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            try:
+                return User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {user_id} не найден')
+        user = User.objects.annotate(
+            activity=(
+                Count('favorite_recipes', distinct=True)
+                + Count('shopping_carts', distinct=True)
+            )
+        ).filter(activity__gt=0).order_by('-activity').first()
+        if user is None:
+            raise CommandError(
+                'В базе нет пользователей с избранным или корзиной'
+            )
+        return user
+
+    def get_cases(self, slugs):
+        return {
+            'all': {},
+            'tag': {'tags': slugs[:1]},
+            'tags': {'tags': slugs},
+            'favorited': {'is_favorited': ['1']},
+            'in_shopping_cart': {'is_in_shopping_cart': ['1']},
+            'combined': {
+                'tags': slugs,
+                'is_favorited': ['1'],
+                'is_in_shopping_cart': ['1'],
+            },
+        }
+
+    def filter(self, params, user):
+        data = QueryDict(mutable=True)
+        for key, values in params.items():
+            data.setlist(key, values)
+        filterset = RecipeFilterBackend(
+            data=data,
+            queryset=Recipe.objects.with_user_flags(user),
+            request=SimpleNamespace(user=user),
+        )
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        return filterset.qs
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = perf_counter()
+            func()
+            timings.append((perf_counter() - start) * 1000)
+        return timings
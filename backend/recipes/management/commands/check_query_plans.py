@@ -0,0 +1,115 @@
+"""
+Команда для проверки планов горячих запросов.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from foodgram.constants import QUERY_PLAN_SEQ_SCAN_MIN_ROWS
+from recipes.models import (
+    FavoriteRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+
+
+class Command(BaseCommand):
+    """
+    Выполняет EXPLAIN для горячих запросов API и падает, если планировщик
+    выбирает для какого-либо из них последовательное сканирование большой
+    таблицы.
+
+    Планы строятся с обычными настройками планировщика по данным текущей
+    базы, поэтому её нужно заранее заполнить (например, командой
+    generate_data) и собрать статистику (флаг --analyze). Сканирование
+    таблиц меньше --min-rows строк ошибкой не считается: для них оно
+    дешевле индекса.
+    """
+
+    help = 'Проверка планов горячих запросов на PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Собрать статистику (ANALYZE) перед проверкой'
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=QUERY_PLAN_SEQ_SCAN_MIN_ROWS,
+            help='Минимальный размер таблицы, для которой Seq Scan — ошибка'
+        )
+
+    def get_queries(self):
+        recipe_ids = list(
+            Recipe.objects.values_list('id', flat=True)[:10]
+        ) or [0]
+        user_id = ShoppingCart.objects.values_list(
+            'user_id', flat=True
+        ).first() or 0
+        author_id = Recipe.objects.values_list(
+            'author_id', flat=True
+        ).first() or 0
+        slug = Tag.objects.values_list('slug', flat=True).first() or ''
+        name = Recipe.objects.values_list('name', flat=True).first()
+        return {
+            'recipe_ingredients': RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).select_related('ingredient'),
+            'shopping_cart_by_user': ShoppingCart.objects.filter(
+                user_id=user_id
+            ),
+            'favorites_by_user': FavoriteRecipe.objects.filter(
+                user_id=user_id
+            ),
+            'recipes_by_author': Recipe.objects.filter(
+                author_id=author_id
+            ).order_by('-pub_date')[:10],
+            'recipes_feed': Recipe.objects.order_by('-pub_date', '-id')[:10],
+            'tag_by_slug': Tag.objects.filter(slug=slug),
+            'recipes_search': Recipe.objects.search(name or 'recipe')[:10],
+        }
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов требует PostgreSQL')
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        failures = []
+        for name, queryset in self.get_queries().items():
+            plan = json.loads(queryset.explain(format='json'))
+            seq_scans = [
+                relation
+                for relation in self.find_seq_scans(plan[0]['Plan'])
+                if self.get_table_rows(relation) >= options['min_rows']
+            ]
+            if seq_scans:
+                failures.append(f'{name}: Seq Scan по {", ".join(seq_scans)}')
+            else:
+                self.stdout.write(f'{name}: OK')
+
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы'))
+
+    def find_seq_scans(self, node):
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', ()):
+            yield from self.find_seq_scans(child)
+
+    @staticmethod
+    def get_table_rows(relation):
+        """Оценка числа строк таблицы по статистике PostgreSQL."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                (relation,)
+            )
+            return cursor.fetchone()[0]
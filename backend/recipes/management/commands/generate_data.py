@@ -0,0 +1,179 @@
+"""
+Команда для генерации синтетических данных для нагрузочного тестирования.
+"""
+import random
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.services import rebuild_feeds, refresh_shopping_lists
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription, User
+
+PASSWORD = 'loadtest-password'
+IMAGE = 'recipes/placeholder.jpg'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    """
+    Генерирует пользователей, рецепты, подписки, избранное и корзины.
+
+    Все случайные величины берутся из random.Random(seed), поэтому при
+    одинаковых параметрах набор данных воспроизводится. Популярность
+    авторов и рецептов распределена по закону Ципфа, что даёт
+    степенное распределение числа подписчиков и добавлений в избранное.
+    """
+
+    help = 'Генерация синтетических данных для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix',
+            default='load',
+            help='Префикс логинов и email сгенерированных пользователей'
+        )
+        parser.add_argument('--max-follows', type=int, default=50)
+        parser.add_argument('--max-favorites', type=int, default=30)
+        parser.add_argument('--max-cart', type=int, default=10)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not self.ingredient_ids or not self.tag_ids:
+            raise CommandError(
+                'Сначала загрузите теги и ингредиенты: '
+                'load_tags, load_ingredients'
+            )
+
+        user_ids = self.create_users(options['users'], options['prefix'])
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+        recipe_ids = self.create_recipes(user_ids, options['recipes'])
+        self.stdout.write(f'Рецептов: {len(recipe_ids)}')
+        self.create_links(
+            Subscription, 'following_id', user_ids, user_ids,
+            options['max_follows']
+        )
+        self.create_links(
+            FavoriteRecipe, 'recipe_id', user_ids, recipe_ids,
+            options['max_favorites']
+        )
+        self.create_links(
+            ShoppingCart, 'recipe_id', user_ids, recipe_ids,
+            options['max_cart']
+        )
+        for batch in batched(user_ids, self.batch_size):
+            refresh_shopping_lists(batch)
+            rebuild_feeds(batch)
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы!'))
+
+    def zipf_weights(self, size):
+        """Накопленные веса распределения Ципфа (s = 1) для size объектов."""
+        return list(accumulate(1 / rank for rank in range(1, size + 1)))
+
+    def create_users(self, count, prefix):
+        password = make_password(PASSWORD)
+        start = User.objects.filter(username__startswith=prefix).count()
+        user_ids = []
+        for batch in batched(range(start, start + count), self.batch_size):
+            users = User.objects.bulk_create(
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name=f'Имя{number}',
+                    last_name=f'Фамилия{number}',
+                    password=password,
+                )
+                for number in batch
+            )
+            user_ids.extend(user.id for user in users)
+        return user_ids
+
+    def create_recipes(self, author_ids, count):
+        weights = self.zipf_weights(len(author_ids))
+        recipe_ids = []
+        for batch in batched(range(count), self.batch_size):
+            authors = self.random.choices(
+                author_ids, cum_weights=weights, k=len(batch)
+            )
+            with transaction.atomic():
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        author_id=author_id,
+                        name=f'Рецепт {number}',
+                        text=f'Описание рецепта {number}',
+                        image=IMAGE,
+                        cooking_time=self.random.randint(5, 180),
+                    )
+                    for number, author_id in zip(batch, authors)
+                )
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe_id=recipe.id,
+                        ingredient_id=ingredient_id,
+                        amount=self.random.randint(1, 500),
+                    )
+                    for recipe in recipes
+                    for ingredient_id in self.random.sample(
+                        self.ingredient_ids,
+                        round(self.random.triangular(3, 15, 7))
+                    )
+                )
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in self.random.sample(
+                        self.tag_ids,
+                        self.random.randint(1, min(3, len(self.tag_ids)))
+                    )
+                )
+            recipe_ids.extend(recipe.id for recipe in recipes)
+        return recipe_ids
+
+    def create_links(self, model, target_field, user_ids, target_ids,
+                     max_links):
+        """
+        Для каждого пользователя создаёт до max_links связей с объектами,
+        выбранными по Ципфу: у немногих популярных объектов их много.
+        """
+        weights = self.zipf_weights(len(target_ids))
+        created = 0
+        for batch in batched(user_ids, self.batch_size):
+            links = []
+            for user_id in batch:
+                targets = set(self.random.choices(
+                    target_ids,
+                    cum_weights=weights,
+                    k=self.random.randint(0, max_links)
+                ))
+                if model is Subscription:
+                    targets.discard(user_id)
+                links.extend(
+                    model(user_id=user_id, **{target_field: target_id})
+                    for target_id in targets
+                )
+            model.objects.bulk_create(links, ignore_conflicts=True)
+            created += len(links)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {created}')
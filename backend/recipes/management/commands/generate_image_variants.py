@@ -0,0 +1,38 @@
+"""
+Команда для создания уменьшенных копий изображений рецептов.
+"""
+from django.core.management.base import BaseCommand
+
+from api.images import (
+    IMAGE_ERRORS,
+    REDUCED_IMAGE_VARIANTS,
+    open_image,
+    save_image_variants,
+)
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Создаёт уменьшенные копии для рецептов, у которых их нет.
+    Основное изображение и его адрес не меняются.
+    """
+
+    help = 'Создаёт уменьшенные копии изображений для рецептов без них'
+
+    def handle(self, *args, **kwargs):
+        recipes = Recipe.objects.exclude(image='').filter(image_thumb='')
+        processed = 0
+        for recipe in recipes.iterator():
+            try:
+                with recipe.image.open('rb') as file:
+                    image = open_image(file.read())
+            except IMAGE_ERRORS as error:
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                continue
+            save_image_variants(recipe, image, REDUCED_IMAGE_VARIANTS)
+            recipe.save(update_fields=('image_medium', 'image_thumb'))
+            processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано рецептов: {processed}')
+        )
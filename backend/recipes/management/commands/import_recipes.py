@@ -0,0 +1,37 @@
+"""
+Команда для импорта рецептов из NDJSON-файла.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importers import RecipeImporter
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импорт рецептов из NDJSON (один рецепт в строке)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к NDJSON-файлу')
+        parser.add_argument(
+            '--author',
+            help='Email автора для строк без поля author'
+        )
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = User.objects.filter(email=options['author']).first()
+            if author is None:
+                raise CommandError(f'Автор {options["author"]} не найден')
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                result = RecipeImporter(default_author=author).run(file)
+        except OSError as error:
+            raise CommandError(error)
+
+        for error in result['errors']:
+            self.stderr.write(f'Строка {error["line"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано рецептов: {result["created"]}, '
+            f'ошибок: {len(result["errors"])}'
+        ))
@@ -1,28 +1,127 @@
 """
 Команда для импота ингридиентов в БД.
 """
+import csv
 import json
+from itertools import islice
+from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from api.cache import invalidate_ingredient_index, invalidate_reference_payload
+from foodgram.constants import (
+    INGREDIENT_COPY_THRESHOLD,
+    INGREDIENT_IMPORT_BATCH_SIZE,
+)
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
     """Команда импорта ингридиентов в базу данных."""
-    help = 'Импорт ингридиентов из файла json'
+    help = 'Импорт ингридиентов из файла json или csv'
 
     BASE_DIR = settings.BASE_DIR
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=self.BASE_DIR / 'data/ingredients.json',
+            type=Path,
+            help='Файл с ингредиентами (.json или .csv)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=INGREDIENT_IMPORT_BATCH_SIZE,
+            type=int,
+            help='Размер пачки для bulk_create'
+        )
+
     def handle(self, *args, **options):
+        path = options['path']
         try:
-            path = self.BASE_DIR / 'data/ingredients.json'
-            with open(path, 'r', encoding='utf-8-sig') as file:
-                data = json.load(file)
-                for item in data:
-                    Ingredient.objects.get_or_create(**item)
-        except CommandError as error:
-            raise CommandError from error
-
-        self.stdout.write(self.style.SUCCESS('Данные успешно загружены'))
+            with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+                rows = self.read_rows(file, path.suffix.lower())
+                if (connection.vendor == 'postgresql'
+                        and path.stat().st_size >= INGREDIENT_COPY_THRESHOLD):
+                    total, inserted = self.copy_rows(rows)
+                else:
+                    total, inserted = self.bulk_create_rows(
+                        rows, options['batch_size']
+                    )
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось загрузить {path}: {error}')
+
+        # Сброс доходит до веб-процессов только через общий кеш.
+        # С кешем в памяти процесса они увидят новые строки по отпечатку
+        # таблицы (см. api.cache.get_table_stamp).
+        invalidate_reference_payload('ingredients')
+        invalidate_ingredient_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные успешно загружены: добавлено {inserted}, '
+            f'пропущено {total - inserted}'
+        ))
+
+    @staticmethod
+    def read_rows(file, suffix):
+        """Построчно отдаёт пары (название, единица измерения)."""
+        if suffix == '.csv':
+            items = csv.reader(file)
+        elif suffix == '.json':
+            items = (
+                (item['name'], item['measurement_unit'])
+                for item in json.load(file)
+            )
+        else:
+            raise ValueError('ожидается файл .json или .csv')
+        for name, measurement_unit in items:
+            yield name.strip(), measurement_unit.strip()
+
+    @staticmethod
+    def bulk_create_rows(rows, batch_size):
+        """
+        Вставляет ингредиенты пачками, пропуская уже существующие
+        благодаря ограничению unique_ingredient_fields.
+        """
+        total = 0
+        before = Ingredient.objects.count()
+        while batch := list(islice(rows, batch_size)):
+            total += len(batch)
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ),
+                ignore_conflicts=True
+            )
+        return total, Ingredient.objects.count() - before
+
+    @staticmethod
+    def copy_rows(rows):
+        """
+        Загружает файл через COPY во временную таблицу и переносит
+        новые строки в таблицу ингредиентов одним INSERT ... SELECT.
+        """
+        table = Ingredient._meta.db_table
+        total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            with cursor.copy(
+                'COPY ingredient_import (name, measurement_unit) FROM STDIN'
+            ) as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    total += 1
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT ON CONSTRAINT unique_ingredient_fields '
+                'DO NOTHING'
+            )
+            inserted = cursor.rowcount
+        return total, inserted
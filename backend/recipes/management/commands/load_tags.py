@@ -3,6 +3,7 @@
 """
 from django.core.management.base import BaseCommand
 
+from api.cache import invalidate_reference_payload, invalidate_tag_catalog
 from recipes.models import Tag
 
 
@@ -15,4 +16,6 @@ class Command(BaseCommand):
             {'name': 'Обед', 'color': '#49B64E', 'slug': 'lunch'},
             {'name': 'Ужин', 'color': '#8775D2', 'slug': 'dinner'}]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        invalidate_reference_payload('tags')
+        invalidate_tag_catalog()
         self.stdout.write(self.style.SUCCESS('Все тэги загружены!'))
@@ -0,0 +1,33 @@
+"""
+Команда для повторной обработки изображений рецептов.
+"""
+from django.core.management.base import BaseCommand
+
+from api.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Обрабатывает загруженные изображения рецептов, обработка которых
+    не завершилась (например, процесс был перезапущен). Рецепты с флагом
+    image_processing без загруженного файла помечаются image_failed.
+
+    Запускается при старте приложения; повторный запуск безопасен.
+    """
+
+    help = 'Обрабатывает изображения рецептов, оставшиеся в очереди'
+
+    def handle(self, *args, **kwargs):
+        pending = Recipe.objects.filter(image_processing=True)
+        lost = pending.filter(image_upload='').update(
+            image_processing=False, image_failed=True
+        )
+        processed = 0
+        for recipe_id in pending.values_list('id', flat=True).iterator():
+            process_recipe_image(recipe_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, '
+            f'потеряно: {lost}'
+        ))
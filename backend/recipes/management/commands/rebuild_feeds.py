@@ -0,0 +1,19 @@
+"""
+Команда для пересборки лент подписок пользователей.
+"""
+from django.core.management.base import BaseCommand
+
+from api.services import rebuild_feeds
+from users.models import Subscription
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает ленты подписок по текущим подпискам'
+
+    def handle(self, *args, **kwargs):
+        user_ids = Subscription.objects.values_list(
+            'user_id', flat=True
+        ).distinct()
+        for user_id in user_ids.iterator():
+            rebuild_feeds((user_id,))
+        self.stdout.write(self.style.SUCCESS('Ленты подписок пересобраны!'))
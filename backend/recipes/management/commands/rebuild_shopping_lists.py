@@ -0,0 +1,19 @@
+"""
+Команда для пересборки списков покупок пользователей.
+"""
+from django.core.management.base import BaseCommand
+
+from api.services import refresh_shopping_lists
+from recipes.models import ShoppingCart
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает списки покупок по корзинам пользователей'
+
+    def handle(self, *args, **kwargs):
+        user_ids = ShoppingCart.objects.values_list(
+            'user_id', flat=True
+        ).distinct()
+        for user_id in user_ids.iterator():
+            refresh_shopping_lists((user_id,))
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны!'))
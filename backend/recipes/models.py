@@ -1,10 +1,19 @@
-from django.db import models
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField,
+)
+from django.db import connections, models
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.db.models.expressions import RawSQL
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 from users.models import User
 from foodgram import constants
 from colorfield.fields import ColorField
 
+from .search import fts5_match_query, get_fts_table
+
 
 class Ingredient(models.Model):
     """Представляет модель ингредиентов, используемую в рецептах."""
@@ -51,7 +60,8 @@ class Tag(models.Model):
         verbose_name='Цвет'
     )
     slug = models.SlugField(
-        max_length=constants.TAG_SLUG_LENGTH
+        max_length=constants.TAG_SLUG_LENGTH,
+        unique=True
     )
 
     class Meta:
@@ -64,6 +74,81 @@ class Tag(models.Model):
         return self.name[:constants.NAME_LENGTH]
 
 
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet рецептов с флагами, зависящими от пользователя."""
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует флаги is_favorited и is_in_shopping_cart
+        для всей выборки одним запросом.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+        )
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию и тексту рецепта.
+
+        Ранг попадает в аннотацию search_rank (больше — релевантнее),
+        выборка сортируется по нему, затем по дате публикации. На СУБД
+        без полнотекстового индекса поиск идёт по вхождению подстроки,
+        совпадения в названии ранжируются выше.
+        """
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql':
+            search_query = SearchQuery(
+                query,
+                config=constants.RECIPE_SEARCH_CONFIG,
+                search_type='websearch'
+            )
+            queryset = self.filter(search_vector=search_query).annotate(
+                search_rank=SearchRank(F('search_vector'), search_query)
+            )
+        elif vendor == 'sqlite':
+            match = fts5_match_query(query)
+            if not match:
+                return self.none()
+            fts = get_fts_table(self.model)
+            table = self.model._meta.db_table
+            queryset = self.filter(id__in=RawSQL(
+                f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', (match,)
+            )).annotate(search_rank=RawSQL(
+                f'SELECT -bm25({fts}, %s, %s) FROM {fts} '
+                f'WHERE {fts} MATCH %s AND {fts}.rowid = {table}.id',
+                (
+                    constants.RECIPE_SEARCH_NAME_WEIGHT,
+                    constants.RECIPE_SEARCH_TEXT_WEIGHT,
+                    match,
+                )
+            ))
+        else:
+            queryset = self.filter(
+                Q(name__icontains=query) | Q(text__icontains=query)
+            ).annotate(search_rank=Case(
+                When(
+                    name__icontains=query,
+                    then=Value(constants.RECIPE_SEARCH_NAME_WEIGHT)
+                ),
+                default=Value(constants.RECIPE_SEARCH_TEXT_WEIGHT),
+            ))
+        return queryset.order_by('-search_rank', '-pub_date', '-id')
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -93,6 +178,29 @@ class Recipe(models.Model):
         upload_to='recipes/',
         verbose_name='Изображение',
     )
+    image_medium = models.ImageField(
+        upload_to='recipes/medium/',
+        blank=True,
+        verbose_name='Изображение среднего размера',
+    )
+    image_thumb = models.ImageField(
+        upload_to='recipes/thumbs/',
+        blank=True,
+        verbose_name='Миниатюра изображения',
+    )
+    image_upload = models.FileField(
+        upload_to='recipes/uploads/',
+        blank=True,
+        verbose_name='Загруженное изображение для обработки',
+    )
+    image_processing = models.BooleanField(
+        default=False,
+        verbose_name='Изображение обрабатывается',
+    )
+    image_failed = models.BooleanField(
+        default=False,
+        verbose_name='Изображение не удалось обработать',
+    )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления',
         validators=(
@@ -110,6 +218,13 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         """Метакласс модели рецепта."""
@@ -117,6 +232,16 @@ class Recipe(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+        )
 
     def __str__(self):
         """Возвращает название рецепта."""
@@ -164,6 +289,13 @@ class RecipeIngredient(models.Model):
 
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient'),
+                include=('amount',),
+                name='recipe_ingredient_amount_idx'
+            ),
+        )
 
     def __str__(self):
         return (f'{self.ingredient.name[:constants.NAME_LENGTH]},'
@@ -240,3 +372,103 @@ class ShoppingCart(UserRecipeModel):
 
     def __str__(self):
         return f'Список покупок {self.user[:constants.NAME_LENGTH]}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается при изменении корзины и ингредиентов рецептов.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество'
+    )
+    recipe_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов'
+    )
+
+    class Meta:
+        """Класс Meta модели ShoppingListItem."""
+
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient',),
+                name='unique_shopping_list_item',
+                violation_error_message=(
+                    {'user, ingredient': 'Поля должны быть уникальны'}
+                )
+            ),
+        )
+
+    def __str__(self):
+        return (f'{self.ingredient.name[:constants.NAME_LENGTH]},'
+                f'кол-во: {self.total_amount}')
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Заполняется при публикации рецепта (fan-out).
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        """Класс Meta модели FeedEntry."""
+
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_feed_entry',
+                violation_error_message=(
+                    {'user, recipe': 'Поля должны быть уникальны'}
+                )
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_entry_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_entry_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} — {self.recipe}'
@@ -0,0 +1,103 @@
+"""
+Полнотекстовый индекс рецептов.
+
+На PostgreSQL колонка search_vector заполняется триггером (название
+с весом A, текст с весом B) и индексируется GIN. На SQLite для локального
+запуска поддерживается внешняя таблица FTS5 с триггерами синхронизации.
+Триггеры срабатывают и при bulk_create, поэтому индекс не зависит
+от того, как рецепт попал в базу.
+"""
+from django.db import connections
+
+from foodgram import constants
+
+POSTGRES_SEARCH_SQL = """
+CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('{config}', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('{config}', coalesce(NEW.text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};
+CREATE TRIGGER {table}_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON {table}
+    FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update();
+
+CREATE INDEX IF NOT EXISTS recipe_search_vector_idx
+    ON {table} USING gin (search_vector);
+
+UPDATE {table} SET name = name WHERE search_vector IS NULL;
+"""
+
+SQLITE_SEARCH_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+        name, text, content='{table}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table}
+    BEGIN
+        INSERT INTO {fts}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table}
+    BEGIN
+        INSERT INTO {fts}({fts}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {fts}_update
+    AFTER UPDATE OF name, text ON {table}
+    BEGIN
+        INSERT INTO {fts}({fts}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {fts}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+)
+
+
+def get_fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+
+def fts5_match_query(query):
+    """
+    Превращает пользовательский ввод в запрос FTS5: каждое слово
+    экранируется и ищется по префиксу, слова объединяются через AND.
+    """
+    words = query.split()
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in words
+    )
+
+
+def install_search_index(model, using):
+    """Создаёт полнотекстовый индекс рецептов для базы using."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_SEARCH_SQL.format(
+                table=table, config=constants.RECIPE_SEARCH_CONFIG
+            ))
+        elif connection.vendor == 'sqlite':
+            fts = get_fts_table(model)
+            created = fts not in connection.introspection.table_names(
+                cursor
+            )
+            for sql in SQLITE_SEARCH_SQL:
+                cursor.execute(sql.format(table=table, fts=fts))
+            if created:
+                cursor.execute(
+                    f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+                )
@@ -0,0 +1,33 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from recipes.models import Ingredient
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'Планы проверяются на PostgreSQL'
+)
+class QueryPlansTest(TestCase):
+    """
+    Горячие запросы не переходят на последовательное сканирование
+    больших таблиц при обычных настройках планировщика.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        output = StringIO()
+        call_command('load_tags', stdout=output)
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(500)
+        )
+        call_command(
+            'generate_data', users=300, recipes=5000, seed=1, stdout=output
+        )
+
+    def test_hot_queries_use_indexes(self):
+        call_command('check_query_plans', analyze=True, stdout=StringIO())